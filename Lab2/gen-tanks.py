@@ -0,0 +1,37 @@
+#
+# GENERATE A RANDOM INSTANCE OF THE TANKS PROBLEM
+# The values are drawn from the same ranges as the instances in tank-data
+# (but the hand-written data-tanks-debug.json): about 20% of the chemicals
+# are dangerous, and the temperature ranges are either narrow (20 to 30
+# degrees, about 15% of them) or wide (80 to 100 degrees)
+#
+import sys
+import json
+import random
+
+if len(sys.argv) != 4:
+    print 'Usage: python %s <chemicals> <tanks> <seed>' % sys.argv[0]
+    sys.exit()
+else:
+    nc, nt, seed = [int(v) for v in sys.argv[1:]]
+
+rnd = random.Random(seed)
+
+chemicals = []
+for i in range(nc):
+    tmin = rnd.randint(-20, 10)
+    if rnd.random() < 0.15:
+        width = rnd.randint(20, 30)
+    else:
+        width = rnd.randint(80, 100)
+    chemicals.append({'amount': rnd.randint(30, 80),
+                      'dangerous': rnd.random() < 0.2,
+                      'tmin': tmin,
+                      'tmax': tmin + width})
+
+tanks = []
+for j in range(nt):
+    tanks.append({'cap': rnd.randint(30, 100),
+                  'safe': rnd.random() < 0.5})
+
+print json.dumps({'chemicals': chemicals, 'tanks': tanks}, indent=2)
@@ -1,24 +1,17 @@
 
 from ortools.constraint_solver import pywrapcp
 
-import sys
-
 import json
 
-#
-# Parse command line
-#
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
+import argparse
 
-#
-# READ PROBLEM DATA
-#
-with open(fname) as fin:
-    data = json.load(fin)
+import glob
+
+import os
+
+import timeit
+
+import sudoku_engine
 
 # For simplicity: coordinates of the 3x3 boxes
 
@@ -54,86 +47,75 @@ boxes  = [
      (8,6), (8,7), (8,8)]
 ]
 
-
-#
-# CREATE A SOLVER INSTANCE
-# Signature: Solver(<solver name>)
-# 
-slv = pywrapcp.Solver('sudoku')
-
-# Cache some data for ease of access
-grid = data['grid']
 n = 9
 
 
 #
-# CREATE VARIABLES
-# Signature: IntVar(<min>, <max>, <name>)
+# BUILD THE MODEL
+# alldiff: how the "all different" constraints are posted
+#   - pairwise: one binary != constraint for each pair of cells
+#   - value:    AllDifferent global, value based propagation
+#   - bounds:   AllDifferent global, bounds consistent propagation
+# Returns the solver and the cell variables
 #
+def build_model(grid, alldiff = 'pairwise'):
+    #
+    # CREATE A SOLVER INSTANCE
+    # Signature: Solver(<solver name>)
+    #
+    slv = pywrapcp.Solver('sudoku')
 
-cells={}
+    #
+    # CREATE VARIABLES
+    # Signature: IntVar(<min>, <max>, <name>)
+    #
 
-for i in range(0,n):
-    for j in range(0,n):
-        cells[(i,j)] = slv.IntVar(1,n,'Cella %d,%d' %(i,j))
+    cells={}
 
-#
-# BUILD CONSTRAINTS AND ADD THEM TO THE MODEL
-# Signature: Add(<constraint>)
-#
+    for i in range(0,n):
+        for j in range(0,n):
+            cells[(i,j)] = slv.IntVar(1,n,'Cella %d,%d' %(i,j))
 
-#Vincolo tutti gli elementi di una riga diversi
+    #
+    # BUILD CONSTRAINTS AND ADD THEM TO THE MODEL
+    # Signature: Add(<constraint>)
+    #
 
-for i in range(0,n):
-    # i indice di riga
-    for j in range(0,n):
-        for k in range(j+1, n):
-            slv.Add(cells[(i,j)] != cells[(i,k)])
+    # Post an "all different" constraint, according to the alldiff option
+    def all_different(variables):
+        if alldiff == 'pairwise':
+            for i in range(0, len(variables)):
+                for j in range(i+1, len(variables)):
+                    slv.Add(variables[i] != variables[j])
+        else:
+            slv.Add(slv.AllDifferent(variables, alldiff == 'bounds'))
 
-#Vincolo tutti gli elementi di una colonna diversi
+    #Vincolo tutti gli elementi di una riga diversi
 
-for j in range(0,n):
-    # i indice di riga
     for i in range(0,n):
-        for k in range(i+1, n):
-            slv.Add(cells[(i,j)] != cells[(k,j)])
+        # i indice di riga
+        all_different([cells[(i,j)] for j in range(0,n)])
 
-#Vincolo tutti gli elementi di un quadrato diversi
+    #Vincolo tutti gli elementi di una colonna diversi
 
-for box in boxes:
-    for i in range(0, len(box)):
-        for j in range(i+1, len(box)):
-            slv.Add(cells[box[i]] != cells[box[j]])
+    for j in range(0,n):
+        # j indice di colonna
+        all_different([cells[(i,j)] for i in range(0,n)])
 
-#Vincoli derivati dagli input fissati
+    #Vincolo tutti gli elementi di un quadrato diversi
 
-for i in range(len(grid)):
-    for j in range(len(grid[i])):
-        if (grid[i][j] != 0):
-             slv.Add(cells[(i,j)] == grid[i][j])
+    for box in boxes:
+        all_different([cells[cell] for cell in box])
 
-#
-# THOSE ARE THE VARIABLES THAT WE WANT TO USE FOR BRANCHING
-#
+    #Vincoli derivati dagli input fissati
 
-# we need to flatten the dictionary here
-all_vars = cells.values()
+    for i in range(len(grid)):
+        for j in range(len(grid[i])):
+            if (grid[i][j] != 0):
+                 slv.Add(cells[(i,j)] == grid[i][j])
 
-#
-# DEFINE THE SEARCH STRATEGY
-# we will keep this fixed for a few more lectures
-#
-decision_builder = slv.Phase(all_vars,
-                                slv.INT_VAR_DEFAULT,
-                                slv.INT_VALUE_DEFAULT)
+    return slv, cells
 
-#
-# INIT THE SEARCH PROCESS
-# we will keep this fixed for a few more lectures
-#
-time_limit = 20000
-search_monitors = [slv.SearchLog(500000), slv.TimeLimit(time_limit)]
-slv.NewSearch(decision_builder, search_monitors)
 
 #
 # Function to print a solution
@@ -144,33 +126,168 @@ def print_sol(cell_content):
     for i in range(n):
         print ' '.join('%d' % cell_content[(i,j)].Value() for j in range(n))
 
+
 #
-# Search for a solution
+# COUNT THE SOLUTIONS (up to 'limit', 0 or None: no limit)
+# The whole enumeration is a single call to the solver: the solutions are
+# counted by a collector, with no Python code running for each of them.
+# Returns the number of solutions, the number of branches and the time (ms)
 #
-nsol = 0
-while slv.NextSolution():
-    print 'SOLUTION FOUND =========================='
-
-    # print the solution
-    print_sol(cells)
+def count_solutions(grid, limit = 2, time_limit = None, alldiff = 'pairwise',
+                    engine = 'cp'):
+    if engine == 'bitmask':
+        start = timeit.default_timer()
+        sudoku = sudoku_engine.Sudoku(grid)
+        nsol = sudoku.search(limit if limit else None)
+        time = int(1000 * (timeit.default_timer() - start))
+        return nsol, sudoku.nodes, time
+
+    slv, cells = build_model(grid, alldiff)
+    decision_builder = slv.Phase(cells.values(),
+                                    slv.INT_VAR_DEFAULT,
+                                    slv.INT_VALUE_DEFAULT)
+    # An empty assignment: the collector stores no values
+    collector = slv.AllSolutionCollector()
+    search_monitors = [collector]
+    if limit:
+        search_monitors.append(slv.SolutionsLimit(limit))
+    if time_limit:
+        search_monitors.append(slv.TimeLimit(time_limit))
+    slv.Solve(decision_builder, search_monitors)
+    return collector.SolutionCount(), slv.Branches(), slv.WallTime()
 
-    print 'END OF SOLUTION =========================='
-
-    # WE WANT A SINGLE SOLUTION
-    nsol += 1
-    break
 
 #
-# END THE SEARCH PROCESS
+# A FUNCTION TO BUILD AND SOLVE A MODEL
+# With count == None the first solution is printed; otherwise the solutions
+# are counted (see 'count_solutions'). In both cases the function returns the
+# number of solutions (None if they are not counted), the number of branches
+# and the computation time
 #
-slv.EndSearch()
-
-if nsol == 0:
-    print 'no solution found'
-
-# Print solution information
-print 'Number of branches: %d' % slv.Branches()
-print 'Number of fails: %d' % slv.Failures()
-print 'Computation time: %f (ms)' % slv.WallTime()
-if slv.WallTime() > time_limit:
-    print 'Time limit exceeded'
\ No newline at end of file
+def solve_problem(data, time_limit = 20000, alldiff = 'pairwise', count = None,
+                  engine = 'cp'):
+    # Cache some data for ease of access
+    grid = data['grid']
+
+    if count != None:
+        nsol, branches, time = count_solutions(grid, count, time_limit,
+                                               alldiff, engine)
+        print 'Number of solutions: %d%s' % (nsol,
+                            ' (limit reached)' if count and nsol >= count else '')
+        print 'Number of branches: %d' % branches
+        print 'Computation time: %f (ms)' % time
+        if time_limit and time > time_limit:
+            print 'Time limit exceeded'
+        return nsol, branches, time
+
+    slv, cells = build_model(grid, alldiff)
+
+    #
+    # THOSE ARE THE VARIABLES THAT WE WANT TO USE FOR BRANCHING
+    #
+
+    # we need to flatten the dictionary here
+    all_vars = cells.values()
+
+    #
+    # DEFINE THE SEARCH STRATEGY
+    # we will keep this fixed for a few more lectures
+    #
+    decision_builder = slv.Phase(all_vars,
+                                    slv.INT_VAR_DEFAULT,
+                                    slv.INT_VALUE_DEFAULT)
+
+    #
+    # INIT THE SEARCH PROCESS
+    # we will keep this fixed for a few more lectures
+    #
+    search_monitors = [slv.SearchLog(500000)]
+    if time_limit:
+        search_monitors.append(slv.TimeLimit(time_limit))
+    slv.NewSearch(decision_builder, search_monitors)
+
+    #
+    # Search for a solution
+    #
+    nsol = 0
+    while slv.NextSolution():
+        print 'SOLUTION FOUND =========================='
+
+        # print the solution
+        print_sol(cells)
+
+        print 'END OF SOLUTION =========================='
+
+        # WE WANT A SINGLE SOLUTION
+        nsol += 1
+        break
+
+    #
+    # END THE SEARCH PROCESS
+    #
+    slv.EndSearch()
+
+    if nsol == 0:
+        print 'no solution found'
+
+    # Print solution information
+    print 'Number of branches: %d' % slv.Branches()
+    print 'Number of fails: %d' % slv.Failures()
+    print 'Computation time: %f (ms)' % slv.WallTime()
+    if time_limit and slv.WallTime() > time_limit:
+        print 'Time limit exceeded'
+
+    return None, slv.Branches(), slv.WallTime()
+
+
+if __name__ == '__main__':
+    #
+    # Parse command line
+    # --alldiff: how the "all different" constraints are posted (see
+    #            'build_model')
+    # --count:   count the solutions, up to the given limit (e.g. 2 to check
+    #            that a puzzle has a unique solution; no value: no limit)
+    # --engine:  cp (the model above) or bitmask (see sudoku_engine.py), for
+    #            --count only
+    # The data file can be a directory: all its JSON files are solved
+    #
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fname', help='data file (or directory)')
+    parser.add_argument('--alldiff', choices=['pairwise', 'value', 'bounds'],
+                        default='pairwise')
+    parser.add_argument('--count', type=int, nargs='?', const=0,
+                        default=None, metavar='LIMIT',
+                        help='count the solutions, up to LIMIT')
+    parser.add_argument('--engine', choices=['cp', 'bitmask'], default='cp')
+    args = parser.parse_args()
+    fname = args.fname
+
+    if os.path.isdir(fname):
+        fnames = sorted(glob.glob(os.path.join(fname, '*.json')))
+    else:
+        fnames = [fname]
+
+    #
+    # READ PROBLEM DATA AND SOLVE
+    #
+    results = []
+    for fname in fnames:
+        with open(fname) as fin:
+            data = json.load(fin)
+        if len(fnames) > 1:
+            print '=== %s' % fname
+        results.append(solve_problem(data, alldiff=args.alldiff,
+                                     count=args.count, engine=args.engine))
+
+    if len(fnames) > 1 and args.count != None:
+        # With --count=1 a single solution says nothing about uniqueness
+        if args.count == 0 or args.count >= 2:
+            label = 'a unique solution'
+            nfound = sum(1 for r in results if r[0] == 1)
+        else:
+            label = '>=1 solutions'
+            nfound = sum(1 for r in results if r[0] >= 1)
+        print '=== %d puzzles, %d with %s, %d without solutions' % \
+                (len(fnames), nfound, label,
+                 sum(1 for r in results if r[0] == 0))
+        print '=== Total computation time: %f (ms)' % sum(r[2] for r in results)
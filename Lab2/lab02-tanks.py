@@ -4,15 +4,28 @@ from ortools.constraint_solver import pywrapcp
 
 import sys
 import json
+import argparse
+import numpy as np
 
 #
 # Parse command line
-#
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
+# --alldiff: how the "one chemical per tank" constraints are posted
+#   - pairwise: one binary != constraint for each pair of chemicals
+#   - value:    AllDifferent global, value based propagation
+#   - bounds:   AllDifferent global, bounds consistent propagation
+# --temperature: how the temperature constraints are posted
+#   - pairwise: one constraint for each pair of incompatible chemicals
+#   - table:    one table of compatible neighbours, shared by all the pairs
+#               of adjacent tanks
+#
+parser = argparse.ArgumentParser()
+parser.add_argument('fname', help='data file')
+parser.add_argument('--alldiff', choices=['pairwise', 'value', 'bounds'],
+                    default='pairwise')
+parser.add_argument('--temperature', choices=['pairwise', 'table'],
+                    default='pairwise')
+args = parser.parse_args()
+fname = args.fname
 
 #
 # READ PROBLEM DATA
@@ -45,10 +58,40 @@ nc = len(chemicals)
 #   - Se tmax_i < tmin_j o tmax_j < tmin_i le due sostanze non possono essere vicine
 
 
+#
+# PREPROCESSING
+# The capacity and safety constraints only depend on the data: the tanks
+# allowed for each chemical (and the pairs of chemicals that cannot be
+# adjacent) are computed once, over whole arrays
+#
+amount = np.array([c['amount'] for c in chemicals])
+dangerous = np.array([c['dangerous'] for c in chemicals], dtype=bool)
+tmin = np.array([c['tmin'] for c in chemicals])
+tmax = np.array([c['tmax'] for c in chemicals])
+cap = np.array([t['cap'] for t in tanks])
+safe = np.array([t['safe'] for t in tanks], dtype=bool)
+
+# allowed[i,j] = True --> la sostanza i puo' stare nel container j
+# (ci sta, e se e' pericolosa il container e' sicuro)
+allowed = (amount[:, np.newaxis] <= cap[np.newaxis, :]) & \
+          (safe[np.newaxis, :] | ~dangerous[:, np.newaxis])
+
+# incompatible[i,j] = True --> le sostanze i e j non possono essere vicine
+incompatible = (tmax[:, np.newaxis] < tmin[np.newaxis, :]) | \
+               (tmin[:, np.newaxis] > tmax[np.newaxis, :])
+
+# A chemical with no allowed tank (or more chemicals than tanks) makes the
+# problem infeasible
+if nc > nt or not allowed.any(axis=1).all():
+    print 'no solution found'
+    sys.exit()
+
 # chemical_vars[i] = j --> Metto la sostanza i nel container j
+# (il dominio contiene solo i container ammessi)
 chemical_vars = []
-for chemical in chemicals:
-    chemical_vars.append(slv.IntVar(range(0,nt), "Sostanza"+str(len(chemical_vars))))
+for i in range(nc):
+    chemical_vars.append(slv.IntVar(np.flatnonzero(allowed[i]).tolist(),
+                                    "Sostanza"+str(i)))
 
 #
 # BUILD CONSTRAINTS AND ADD THEM TO THE MODEL
@@ -56,28 +99,43 @@ for chemical in chemicals:
 #
 
 # Vincoli una sola sostanza per container
-for i in range(0, len(chemical_vars)):
-    for j in range(i+1, len(chemical_vars)):
-        slv.Add(chemical_vars[i] != chemical_vars[j])
-
-
-for i in range(0,len(chemical_vars)):
-    for j in range(0, len(tanks)):
-        # Vincoli sulla capacità per la variabile i
-        #   Se non ci sta aggiungo il vincolo che sia diverso
-        if chemicals[i]['amount'] > tanks[j]['cap']:
-            slv.Add(chemical_vars[i] != j)
-        # Vincolo sulla sicurezza
-        # Se il nontenitore non è sicuro e la sostanza è pericolosa aggiungo il vincolo del diverso
-        if not(tanks[j]['safe']) and chemicals[i]['dangerous']:
-            slv.Add(chemical_vars[i] != j)
+if args.alldiff == 'pairwise':
+    for i in range(0, len(chemical_vars)):
+        for j in range(i+1, len(chemical_vars)):
+            slv.Add(chemical_vars[i] != chemical_vars[j])
+else:
+    slv.Add(slv.AllDifferent(chemical_vars, args.alldiff == 'bounds'))
 
+# I vincoli sulla capacita' e sulla sicurezza sono gia' nei domini
 
 # Vincolo sulla termperatura
-for i in range(0,len(chemical_vars)):
-    for j in range(i+1, len(chemical_vars)):
-        if chemicals[i]['tmax'] < chemicals[j]['tmin'] or chemicals[i]['tmin'] > chemicals[j]['tmax']:
-            slv.Add(abs(chemical_vars[i] - chemical_vars[j]) != 1)
+if args.temperature == 'pairwise':
+    for i, j in zip(*np.nonzero(np.triu(incompatible, 1))):
+        slv.Add(abs(chemical_vars[i] - chemical_vars[j]) != 1)
+else:
+    # content[j] = i --> il container j contiene la sostanza i
+    # (i >= nc: il container j e' vuoto)
+    # The chemicals (plus one dummy chemical for each empty tank) and the
+    # tank contents are channeled as inverse permutations. Then the same
+    # table of compatible neighbours is used for every pair of adjacent
+    # tanks: the model grows with nt instead of with the incompatible pairs
+    empty = [slv.IntVar(0, nt-1, 'Vuoto %d' % k) for k in range(nt - nc)]
+    content = [slv.IntVar(0, nt-1, 'Container %d' % j) for j in range(nt)]
+    slv.Add(slv.InversePermutationConstraint(chemical_vars + empty, content))
+    # I container vuoti sono indistinguibili (rompo le simmetrie)
+    for k in range(len(empty)-1):
+        slv.Add(empty[k] < empty[k+1])
+    compatible = np.ones((nt, nt), dtype=bool)
+    compatible[:nc, :nc] = ~incompatible
+    np.fill_diagonal(compatible, False)
+    # A single tuple set: the AllowedAssignments constraints share it,
+    # instead of each one converting its own copy of a list of pairs
+    neighbours = pywrapcp.IntTupleSet(2)
+    for i, k in np.argwhere(compatible).tolist():
+        neighbours.Insert2(i, k)
+    for j in range(nt-1):
+        slv.Add(slv.AllowedAssignments([content[j], content[j+1]],
+                                       neighbours))
 
 
 #
@@ -161,6 +219,7 @@ if nsol == 0:
 
 # Print solution information
 print 'Number of branches: %d' % slv.Branches()
+print 'Number of fails: %d' % slv.Failures()
 print 'Computation time: %f (ms)' % slv.WallTime()
 if slv.WallTime() > time_limit:
     print 'Time limit exceeded'
\ No newline at end of file
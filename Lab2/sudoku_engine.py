@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+#
+# A DEDICATED SUDOKU ENGINE
+#
+# Bulk alternative to the CP model in lab02-sudoku.py (which stays as the
+# reference): the state is kept in a few integers, i.e. one 9-bit mask of
+# the used digits for each row, column and box (bit d-1 for digit d), so
+# the candidates of a cell are just
+#
+#   FULL & ~(rows[r] | cols[c] | boxes[b])
+#
+# The search is a backtracking with MRV (the cell with the fewest candidates
+# first) and, at each node, propagation of naked singles (a cell with one
+# candidate) and hidden singles (a digit with one candidate cell in a row,
+# column or box) up to a fixed point.
+#
+# Example (the JSON files in sudoku-data are the benchmark corpus):
+#   python sudoku_engine.py sudoku-data --repeat 100
+#
+import argparse
+import glob
+import json
+import os
+import timeit
+
+n = 9
+FULL = (1 << n) - 1
+
+# Row, column and box of each cell (cells are numbered 0..80, row-wise)
+ROW = [k // n for k in range(n * n)]
+COL = [k % n for k in range(n * n)]
+BOX = [3 * (ROW[k] // 3) + COL[k] // 3 for k in range(n * n)]
+
+# The 27 units (rows, columns, boxes), as lists of cells
+UNITS = [[k for k in range(n * n) if ROW[k] == i] for i in range(n)] + \
+        [[k for k in range(n * n) if COL[k] == j] for j in range(n)] + \
+        [[k for k in range(n * n) if BOX[k] == b] for b in range(n)]
+
+# Number of candidates in each mask
+POPCOUNT = [bin(m).count('1') for m in range(FULL + 1)]
+
+
+class Sudoku(object):
+    '''
+    Search state: the cell contents (0 for an empty cell) and the bitmasks of
+    the digits used in each row, column and box
+    '''
+    def __init__(self, grid):
+        self.cells = [0] * (n * n)
+        self.rows = [0] * n
+        self.cols = [0] * n
+        self.boxes = [0] * n
+        # False if two givens clash
+        self.valid = True
+        # Search statistics
+        self.nodes = 0
+        self.fails = 0
+        for i in range(n):
+            for j in range(n):
+                k = i * n + j
+                if grid[i][j] != 0:
+                    bit = 1 << (grid[i][j] - 1)
+                    if (self.rows[ROW[k]] | self.cols[COL[k]] |
+                            self.boxes[BOX[k]]) & bit:
+                        self.valid = False
+                    self.place(k, bit)
+
+    def place(self, k, bit):
+        self.cells[k] = bit.bit_length()
+        self.rows[ROW[k]] |= bit
+        self.cols[COL[k]] |= bit
+        self.boxes[BOX[k]] |= bit
+
+    def unplace(self, k):
+        bit = 1 << (self.cells[k] - 1)
+        self.cells[k] = 0
+        self.rows[ROW[k]] &= ~bit
+        self.cols[COL[k]] &= ~bit
+        self.boxes[BOX[k]] &= ~bit
+
+    # Place the naked and hidden singles, up to a fixed point. The placed
+    # cells are appended to 'trail'. Returns the candidates of each cell (0
+    # for the filled ones), or None if a contradiction is found
+    def propagate(self, trail):
+        cells, rows, cols, boxes = self.cells, self.rows, self.cols, self.boxes
+        while True:
+            # Naked singles (placed immediately, the masks are then up to
+            # date for the following cells)
+            masks = [0] * (n * n)
+            changed = False
+            for k in range(n * n):
+                if cells[k] != 0:
+                    continue
+                m = FULL & ~(rows[ROW[k]] | cols[COL[k]] | boxes[BOX[k]])
+                if m & (m - 1) == 0:
+                    if m == 0:
+                        return None
+                    self.place(k, m)
+                    trail.append(k)
+                    changed = True
+                else:
+                    masks[k] = m
+            if changed:
+                continue
+            # Hidden singles
+            forced = []
+            used = rows + cols + boxes
+            for u, unit in enumerate(UNITS):
+                once, twice = 0, 0
+                for k in unit:
+                    m = masks[k]
+                    twice |= once & m
+                    once |= m
+                # Some digit has no place left in the unit
+                if once | used[u] != FULL:
+                    return None
+                hidden = once & ~twice
+                if hidden:
+                    for k in unit:
+                        if masks[k] & hidden:
+                            forced.append((k, masks[k] & hidden))
+            if len(forced) == 0:
+                return masks
+            # All the hidden singles follow from the same state, hence they
+            # must be compatible
+            for k, bit in forced:
+                if bit & (bit - 1):
+                    # Two digits that fit only in the same cell
+                    return None
+                if cells[k] != 0:
+                    if cells[k] != bit.bit_length():
+                        return None
+                elif (rows[ROW[k]] | cols[COL[k]] | boxes[BOX[k]]) & bit:
+                    return None
+                else:
+                    self.place(k, bit)
+                    trail.append(k)
+
+    # Depth first search; stops after 'limit' solutions (None: no limit).
+    # The first solution is stored in self.solution. Returns the number of
+    # solutions found
+    def search(self, limit = 1):
+        self.solution = None
+        self.found = 0
+        if self.valid:
+            self._search(limit)
+        return self.found
+
+    def _search(self, limit):
+        self.nodes += 1
+        trail = []
+        masks = self.propagate(trail)
+        # MRV: branch on the cell with the fewest candidates
+        k, size = -1, n + 1
+        if masks != None:
+            for i in range(n * n):
+                if masks[i] and POPCOUNT[masks[i]] < size:
+                    k, size = i, POPCOUNT[masks[i]]
+        if masks == None:
+            self.fails += 1
+        elif k < 0:
+            # No empty cell left
+            self.found += 1
+            if self.solution == None:
+                self.solution = [self.cells[i * n : (i + 1) * n]
+                                 for i in range(n)]
+        else:
+            m = masks[k]
+            while m != 0 and (limit == None or self.found < limit):
+                bit = m & -m
+                m ^= bit
+                self.place(k, bit)
+                self._search(limit)
+                self.unplace(k)
+        for k in reversed(trail):
+            self.unplace(k)
+
+
+#
+# API
+# A grid is a 9x9 list of lists, with 0 for the empty cells (as in the JSON
+# files in sudoku-data)
+#
+
+# Returns a solution (a 9x9 list of lists), or None if there is none
+def solve(grid):
+    sudoku = Sudoku(grid)
+    sudoku.search(1)
+    return sudoku.solution
+
+
+# Returns the number of solutions, stopping at 'limit' (None: no limit)
+def count_solutions(grid, limit = None):
+    return Sudoku(grid).search(limit)
+
+
+# Solve a sequence of grids; the solutions (or None) are generated lazily,
+# in the same order
+def solve_batch(grids):
+    for grid in grids:
+        yield solve(grid)
+
+
+# True if 'sol' is a complete, valid grid that agrees with the givens
+def check_solution(grid, sol):
+    cells = [sol[k // n][k % n] for k in range(n * n)]
+    if any(grid[k // n][k % n] not in (0, cells[k]) for k in range(n * n)):
+        return False
+    return all(sorted(cells[k] for k in unit) == range(1, n + 1)
+               for unit in UNITS)
+
+
+# Load grids from a JSON file (with a 'grid' field), from a directory of JSON
+# files, or from a text file with one puzzle per line (81 characters, with 0
+# or '.' for the empty cells)
+def load_grids(path):
+    if os.path.isdir(path):
+        grids = []
+        for fname in sorted(glob.glob(os.path.join(path, '*.json'))):
+            grids.extend(load_grids(fname))
+        return grids
+    with open(path) as fin:
+        if path.endswith('.json'):
+            return [json.load(fin)['grid']]
+        grids = []
+        for line in fin:
+            line = line.strip().replace('.', '0')
+            if len(line) == n * n:
+                grids.append([[int(c) for c in line[i * n : (i + 1) * n]]
+                              for i in range(n)])
+        return grids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bitmask sudoku engine')
+    parser.add_argument('path', help='JSON file, directory or puzzle list')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='solve the whole corpus this many times')
+    parser.add_argument('--check', action='store_true',
+                        help='verify every solution')
+    parser.add_argument('--print', action='store_true', dest='print_sol',
+                        help='print the solutions')
+    args = parser.parse_args()
+
+    grids = load_grids(args.path)
+    start = timeit.default_timer()
+    nsolved, nwrong = 0, 0
+    for rep in range(args.repeat):
+        for grid, sol in zip(grids, solve_batch(grids)):
+            if sol == None:
+                continue
+            nsolved += 1
+            if args.check and not check_solution(grid, sol):
+                nwrong += 1
+            if args.print_sol and rep == 0:
+                for row in sol:
+                    print ' '.join('%d' % v for v in row)
+                print
+    elapsed = timeit.default_timer() - start
+
+    ngrids = len(grids) * args.repeat
+    print '--- Grids: %d, solved: %d' % (ngrids, nsolved)
+    if args.check:
+        print '--- Wrong solutions: %d' % nwrong
+    print '--- Computation time: %.3f (sec)' % elapsed
+    if elapsed > 0:
+        print '--- Grids per second: %.1f' % (ngrids / elapsed)
@@ -0,0 +1,15 @@
+#!/usr/bin/env sh
+#
+# Compare the posting variants of the "all different" constraints
+# Usage: sh test-alldiff.sh <model script> <data dir>
+# e.g.   sh test-alldiff.sh lab02-sudoku.py sudoku-data
+#        sh test-alldiff.sh lab02-tanks.py tank-data
+#
+
+for fname in `ls $2/*.json`; do
+	for variant in pairwise value bounds; do
+		echo "SOLVING INSTANCE $fname (--alldiff=$variant)"
+		python $1 $fname --alldiff=$variant | grep "Number of\|Computation time\|Time limit"
+		echo ''
+	done
+done
@@ -0,0 +1,19 @@
+#!/usr/bin/env sh
+#
+# Compare the encodings of the temperature constraints in the tanks model
+# Usage: sh test-temperature.sh <data dir>
+# e.g. on random 50x50 instances:
+#   mkdir tank-data-50
+#   for seed in 0 1 2 3 4; do
+#       python gen-tanks.py 50 50 $seed > tank-data-50/data-tanks-50-50-$seed.json
+#   done
+#   sh test-temperature.sh tank-data-50
+#
+
+for fname in `ls $1/*.json`; do
+	for variant in pairwise table; do
+		echo "SOLVING INSTANCE $fname (--temperature=$variant)"
+		python lab02-tanks.py $fname --temperature=$variant | grep "Number of\|Computation time\|Time limit\|no solution"
+		echo ''
+	done
+done
@@ -4,15 +4,24 @@
 from ortools.constraint_solver import pywrapcp
 import sys
 import json
+import argparse
+import itertools
+import timeit
 
 #
 # Optimization methods
 #
 
 # BRANCH AND BOUND
+# incumbent: value of a known solution (e.g. from 'edf_schedule'), passed as
+#            a hint to the solve function
 def branch_and_bound(solve_function, data,
-                     time_limit = None):
-    zbest, branches, time = solve_function(data, time_limit)
+                     time_limit = None, incumbent = None):
+    if incumbent != None:
+        zbest, branches, time = solve_function(data, time_limit,
+                                               incumbent = incumbent)
+    else:
+        zbest, branches, time = solve_function(data, time_limit)
     print
     print '===============================================' 
     if zbest != None:
@@ -24,78 +33,142 @@ def branch_and_bound(solve_function, data,
     print '===============================================' 
 
 
+# TIME BUDGET
+# The methods below share a single time budget among all their calls to
+# the solve function: each call gets only the remaining time.
+def get_deadline(time_limit):
+    if time_limit == None:
+        return None
+    return timeit.default_timer() + time_limit / 1000.0
+
+
+# Remaining time before the deadline, in ms (None if there is no deadline)
+def remaining_time(deadline):
+    if deadline == None:
+        return None
+    return int((deadline - timeit.default_timer()) * 1000)
+
+
 # DESTRUCTIVE LOWER BOUNDING
-def destructive_lb(solve_function, data, start, time_limit = None):
+# Returns the solution value (None if not found) and the best lower bound.
+# If max_value is given, values above it are not checked (the problem is
+# then infeasible)
+def destructive_lb(solve_function, data, start, time_limit = None,
+                   max_value = None):
     zbest = None
     branches, time = 0, 0
-    while zbest == None:
+    deadline = get_deadline(time_limit)
+    timed_out = False
+    while zbest == None and (max_value == None or start <= max_value):
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '===============================================' 
         print 'Checking value %d for feasibility' % start
         print '==============================================='
         print
-        zbest, br, tm = solve_function(data, time_limit = time_limit, ub = start)
+        zbest, br, tm = solve_function(data, time_limit = tlim, ub = start)
         branches += br
         time += tm
         if zbest == None:
+            # A probe that ran out of time proves nothing
+            if tlim != None and tm >= tlim:
+                timed_out = True
+                break
             start += 1
     print
     print '===============================================' 
     if zbest != None:
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
+    elif timed_out:
+        print 'TIME LIMIT EXCEEDED'
     else:
         print 'THE PROBLEM WAS INFEASIBLE'
+    print 'best lower bound is: %d' % start
     print 'total number of branches is: %d' % branches
     print 'total time: %f' % time
     print '===============================================' 
+    return zbest, start
 
 
 # DESTRUCTIVE UPPER BOUNDING
+# Returns the best solution value and the best lower bound (None if the
+# time budget ran out before optimality was proved)
 def destructive_ub(solve_function, data, start, time_limit = None):
     zbest = start
     last_z = zbest
+    lb = None
     branches, time = 0, 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while last_z != None:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '===============================================' 
         print 'Searching for a solution within cost %d' % start
         print '==============================================='
         print
-        last_z, br, tm = solve_function(data, time_limit = time_limit, ub = start)
+        last_z, br, tm = solve_function(data, time_limit = tlim, ub = start)
         branches += br
         time += tm
         if last_z != None:
             zbest = last_z
             start = zbest - 1
+        elif tlim != None and tm >= tlim:
+            timed_out = True
+        else:
+            lb = start + 1
     print 
     print '===============================================' 
     if zbest != None:
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
     else:
         print 'THE PROBLEM WAS INFEASIBLE'
+    if lb != None:
+        print 'best lower bound is: %d' % lb
+    if timed_out:
+        print 'TIME LIMIT EXCEEDED'
     print 'total number of branches is: %d' % branches
     print 'total time: %f' % time
     print '===============================================' 
+    return zbest, lb
 
 
 # BINARY SEARCH
+# Returns the best solution value and the best lower bound
 def binary_search(solve_function, data, start_lb, start_ub, time_limit = None):
     zbest = start_ub
+    lb = start_lb+1
     branches, time = 0, 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while zbest > start_lb+1:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '===============================================' 
         print 'Searching for a solution with cost in [%d..%d]' % (start_lb, start_ub)
         print '==============================================='
         print
-        last_z, br, tm = solve_function(data, time_limit = time_limit,
+        last_z, br, tm = solve_function(data, time_limit = tlim,
                                  lb = start_lb+1, ub = start_ub)
         branches += br
         time += tm
         if last_z != None:
             zbest = last_z
             start_ub = zbest - 1
+        elif tlim != None and tm >= tlim:
+            timed_out = True
+            break
         else:
+            lb = start_ub + 1
             start_lb = start_ub + 1
     print 
     print '===============================================' 
@@ -103,183 +176,629 @@ def binary_search(solve_function, data, start_lb, start_ub, time_limit = None):
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
     else:
         print 'THE PROBLEM WAS INFEASIBLE'
+    print 'best lower bound is: %d' % lb
+    if timed_out:
+        print 'TIME LIMIT EXCEEDED'
     print 'total number of branches is: %d' % branches
     print 'total time: %f' % time
     print '===============================================' 
+    return zbest, lb
 
 
 #
-# A FUNCTION TO BUILD AND SOLVE A MODEL
-# time_limit: if None, not time limit is employed. If integer, a time limit is
-#             enforced, but optimality is no longer guaranteed!
-# lb:         lower bound
-# ub:         upper bound
-# 
-# If both 'lb' and 'ub' are None, then Branch and bound is used for optimization
+# EARLIEST DEADLINE FIRST
+# A list scheduler, with the units sorted by deadline: at each time step the
+# first unit that can follow the previous one (according to 'setups') is
+# scheduled; if there is none, the time step is left idle. With wait = True,
+# when the most urgent unit is blocked by a setup and can still be delayed,
+# the time step is left idle rather than filled with a less urgent unit.
+# Returns the makespan (the last start time) and the start time of each
+# unit, or None if some unit misses its deadline
 #
-def solve_problem(data, time_limit = None, lb = None, ub = None):
-    # Cache some useful data
-    setups = data['setups']
-    order_list = data['order_list']
+def edf_list_schedule(unit_list, setup_pairs, wait = False):
+    todo = sorted(range(len(unit_list)), key=lambda i: unit_list[i]['dline'])
+    start = [None] * len(unit_list)
+    t, last = 0, None
+    while len(todo) > 0:
+        ready = [k for k, i in enumerate(todo)
+                 if (last, unit_list[i]['prod']) not in setup_pairs]
+        urgent = unit_list[todo[0]]['dline'] - t <= 1
+        if len(ready) == 0 or (wait and ready[0] != 0 and not urgent):
+            # Idle time step
+            t, last = t + 1, None
+            continue
+        i = todo.pop(ready[0])
+        if t >= unit_list[i]['dline']:
+            return None
+        start[i] = t
+        t, last = t + 1, unit_list[i]['prod']
+    return t - 1, start
+
+
+# The best of the two EDF variants (None if both fail). With setups = False
+# the setups are ignored: EDF is then exact for unit tasks with deadlines,
+# hence if it fails the problem is infeasible
+def edf_schedule(data, setups = True):
     unit_list = data['unit_list']
-    order_table = data['order_table']
-    no = len(order_list)
-    nu = len(unit_list)
+    setup_pairs = set((p1, p2) for p1, p2 in data['setups']) if setups \
+                  else set()
+    best = None
+    for wait in (False, True):
+        res = edf_list_schedule(unit_list, setup_pairs, wait)
+        if res != None and (best == None or res[0] < best[0]):
+            best = res
+    return best
 
-    # Build solver instance
-    slv = pywrapcp.Solver('production-scheduling')
 
-    #
-    # CREATE VARIABLES
-    #
-    # X i = t - Il prodotto i-esimo della lista unit_list viene prodotto all'istante t
+#
+# UNITS DUE AT EACH TIME
+# unit_list is the reference: order_table is redundant, and it is checked
+# against it when the data is loaded (an instance generator that overwrites
+# orders with the same product and deadline can leave them out of sync)
+#
+def unit_table(data):
+    npr = len(data['order_table'])
+    eoh = max(o['dline'] for o in data['order_list'])
+    table = [[0] * (eoh + 1) for p in range(npr)]
+    for u in data['unit_list']:
+        table[u['prod']][u['dline']] += 1
+    return table
 
-    eoh = max(o['dline'] for o in order_list)
 
-    x = []
+#
+# DEADLINE COUNTS
+# The units due by a deadline d must start in [0, d), together with one
+# separator slot (idle, or taken by another unit) for each setup between
+# them. A lower bound on the number of setups comes from the products
+# involved: p2 can follow p1 without a setup if a chain of products with no
+# setups leads from p1 to p2; the products are then visited in the order
+# that needs the fewest setups.
+#
 
-    # creo una lista per ogni tipo di prodotto
-    for i in range(0, nu):
-        x.append(slv.IntVar(0,eoh,'Prod %d'%i))
+# Minimum number of setups to go through all the given products (0 if there
+# are too many products to try all the orders). The chains with no setups
+# can pass through the 'bridges' products as well
+def min_setups(prods, setup_pairs, bridges = ()):
+    prods = sorted(prods)
+    if len(prods) > 8:
+        return 0
+    nodes = set(prods) | set(bridges)
+    reach = {(p, q) : (p, q) not in setup_pairs for p in nodes for q in nodes}
+    for k in nodes:
+        for p in nodes:
+            for q in nodes:
+                reach[p, q] = reach[p, q] or (reach[p, k] and reach[k, q])
+    return min(sum(1 for p, q in zip(order, order[1:]) if not reach[p, q])
+               for order in itertools.permutations(prods))
+
+
+# For each distinct deadline d (in increasing order): d, the number of units
+# due by d and the number of slots before d they can use, i.e. d minus the
+# setups among them. The problem is infeasible if some units do not fit
+def deadline_counts(data):
+    unit_list = data['unit_list']
+    setup_pairs = set((p1, p2) for p1, p2 in data['setups'])
+    counts = []
+    for d in sorted(set(u['dline'] for u in unit_list)):
+        due = [u for u in unit_list if u['dline'] <= d]
+        prods = set(u['prod'] for u in due)
+        counts.append((d, len(due), d - min_setups(prods, setup_pairs)))
+    return counts
+
+
+# Lower bound on the makespan: all the units, plus an idle slot for each
+# setup between their products
+def makespan_lb(data):
+    unit_list = data['unit_list']
+    setup_pairs = set((p1, p2) for p1, p2 in data['setups'])
+    prods = set(u['prod'] for u in unit_list)
+    return len(unit_list) - 1 + min_setups(prods, setup_pairs)
+
+
+# Post the deadline counts as redundant constraints on the start times x and
+# the makespan z: each unit is mapped to the interval between two consecutive
+# deadlines where it starts, the units in each interval are counted by a
+# Distribute constraint, and the units that start before each deadline d are
+# bounded by the slots left by the idle ones. Those are not the setups of
+# 'deadline_counts': a unit due later can take the separator slot between two
+# units due by d, but then it is counted as well. Hence the idle slots are
+# the setups among the products due by d, with chains that can pass through
+# any product
+def post_deadline_counts(slv, x, z, data):
+    counts = deadline_counts(data)
+    unit_list = data['unit_list']
+    setup_pairs = set((p1, p2) for p1, p2 in data['setups'])
+    all_prods = set(u['prod'] for u in unit_list)
+    dlines = [d for d, due, slots in counts]
+    eoh = dlines[-1]
+    # Interval of each time step (time eoh is in the last one)
+    interval = [0] * (eoh + 1)
+    for k in range(1, len(dlines)):
+        for t in range(dlines[k - 1], dlines[k]):
+            interval[t] = k
+    interval[eoh] = len(dlines) - 1
+    y = [slv.Element(interval, x[i]).Var() for i in range(len(x))]
+    cards = [slv.IntVar(0, len(x)) for k in range(len(dlines))]
+    slv.Add(slv.Distribute(y, range(len(dlines)), cards))
+    for k, (d, due, slots) in enumerate(counts):
+        prods = set(u['prod'] for u in unit_list if u['dline'] <= d)
+        idle = min_setups(prods, setup_pairs, all_prods)
+        slv.Add(slv.Sum(cards[:k+1]) >= due)
+        slv.Add(slv.Sum(cards[:k+1]) <= d - idle)
+    slv.Add(z >= makespan_lb(data))
 
-    # Objective variable
-    z = slv.IntVar(0,eoh)
 
-    #
-    # BUILD CONSTRAINTS AND ADD THEM TO THE MODEL
-    #
+#
+# A REUSABLE MODEL
+# The variables and the constraints are built only once. Each call to
+# 'solve' restricts the range of the cost variable just for the duration of
+# the search (by restoring an assignment at the root of the search tree), so
+# that all the probes of the optimization methods run on the same solver.
+#
+class ProductionSchedulingModel(object):
+    '''
+    The production scheduling model, built once and solved many times
+    '''
+    # alldiff: how the "all different" constraint on the units is posted
+    #   - pairwise: one binary != constraint for each pair of units
+    #   - value:    AllDifferent global, value based propagation
+    #   - bounds:   AllDifferent global, bounds consistent propagation
+    # counting: if True, post the redundant deadline counts (see
+    #           'post_deadline_counts')
+    def __init__(self, data, alldiff = 'pairwise', counting = False):
+        # Cache some useful data
+        setups = data['setups']
+        order_list = data['order_list']
+        unit_list = data['unit_list']
+        order_table = data['order_table']
+        no = len(order_list)
+        nu = len(unit_list)
+
+        # Units grouped by product, and by product and deadline (the indices
+        # are in increasing order)
+        units_by_prod = {}
+        units_by_dline = {}
+        for i, u in enumerate(unit_list):
+            units_by_prod.setdefault(u['prod'], []).append(i)
+            units_by_dline.setdefault((u['prod'], u['dline']), []).append(i)
+
+        # Build solver instance
+        slv = pywrapcp.Solver('production-scheduling')
 
-    # Vincolo 1
-    # tutte le variabili diverse tra loro
+        #
+        # CREATE VARIABLES
+        #
+        # X i = t - Il prodotto i-esimo della lista unit_list viene prodotto all'istante t
 
-    for i in range(0, nu):
-        for j in range(i+1, nu):
-            slv.Add(x[i] != x[j])
+        eoh = max(o['dline'] for o in order_list)
 
-    # Vincolo 2
-    # Per ogni prodotto, deve essere prodotto prima della sua deadline
+        x = []
 
-    for i in range(0, nu):
-        slv.Add(x[i] < unit_list[i]['dline'])
+        # creo una lista per ogni tipo di prodotto
+        for i in range(0, nu):
+            x.append(slv.IntVar(0,eoh,'Prod %d'%i))
 
-    # Vincolo 3
-    # Minimizzare il makespan
-    # z = max(start time)
-    # z definition constraints
+        # Objective variable
+        z = slv.IntVar(0,eoh)
 
-    slv.Add(z == slv.Max(x))
+        #
+        # BUILD CONSTRAINTS AND ADD THEM TO THE MODEL
+        #
 
-    # Vincolo 4
-    # Attesa del set up
-    # La differenza di due prodotti incompatibili deve essere diversa di 1
-    # S_i + 1 != S_j con i e j incpmpatibili
+        # Vincolo 1
+        # tutte le variabili diverse tra loro
 
-    for i, u1 in enumerate(unit_list):
-        for j, u2 in enumerate(unit_list):
-            for setup in setups:
-                p1 = setup[0]
-                p2 = setup[1]
-                if i != j and u1['prod'] == p1 and u2['prod'] == p2:
-                    slv.Add(x[i] + 1 != x[j])
+        if alldiff == 'pairwise':
+            for i in range(0, nu):
+                for j in range(i+1, nu):
+                    slv.Add(x[i] != x[j])
+        else:
+            slv.Add(slv.AllDifferent(x, alldiff == 'bounds'))
 
-    # Questo modello ha tante soluzioni simmetriche
-    # Se ho un blocco di prodotti che vengono prodotti in serie ci sono tante soluzioni
-    # simili che vanno a far aumentare la dimensione dell'albero
-    # E' possibile inserire dei vincoli per rompere queste simmetrie ed ottenere 
-    # delle prestazioni molto migliori
+        # Vincolo 2
+        # Per ogni prodotto, deve essere prodotto prima della sua deadline
 
-    for i, u1 in enumerate(unit_list):
-        for j, u2 in enumerate(unit_list):
-            if u1['prod'] == u2['prod'] and u1['dline'] == u2['dline'] and i < j:
-                slv.Add(x[i] > x[j])
+        for i in range(0, nu):
+            slv.Add(x[i] < unit_list[i]['dline'])
 
-    # Anche quando si forzano le simmetrie, la scelta influisce sulle presstazione
-    # ad esempio usare il > porta ad esploare meno branch rispetto il <
+        # Vincolo 3
+        # Minimizzare il makespan
+        # z = max(start time)
+        # z definition constraints
 
-    # Optional bounding constraints
-    if lb != None:
-        slv.Add(z >= lb)
-    if ub != None:
-        slv.Add(z <= ub)
+        slv.Add(z == slv.Max(x))
 
-    #
-    # THOSE ARE THE VARIABLES THAT WE WANT TO USE FOR BRANCHING
-    #
-    all_vars = x
+        # Vincolo 4
+        # Attesa del set up
+        # La differenza di due prodotti incompatibili deve essere diversa di 1
+        # S_i + 1 != S_j con i e j incpmpatibili
 
-    # DEFINE THE SEARCH STRATEGY
-    decision_builder = slv.Phase(all_vars,
-                                 slv.INT_VAR_DEFAULT,
-                                 slv.INT_VALUE_DEFAULT)
+        # (solo tra le unita' dei prodotti che compaiono nei setup)
 
-    # INIT THE SEARCH PROCESS
+        for p1, p2 in setups:
+            for i in units_by_prod.get(p1, []):
+                for j in units_by_prod.get(p2, []):
+                    if i != j:
+                        slv.Add(x[i] + 1 != x[j])
 
-    # log monitor (just to have some feedback)
-    # search_monitors = [slv.SearchLog(500000)]
-    search_monitors = []
-    # enforce a time limit (if requested)
-    if time_limit:
-       search_monitors.append(slv.TimeLimit(time_limit))
-    # enable branch and bound
-    if lb == None and ub == None:
-        search_monitors.append(slv.Minimize(z, 1))
+        # Questo modello ha tante soluzioni simmetriche
+        # Se ho un blocco di prodotti che vengono prodotti in serie ci sono tante soluzioni
+        # simili che vanno a far aumentare la dimensione dell'albero
+        # E' possibile inserire dei vincoli per rompere queste simmetrie ed ottenere 
+        # delle prestazioni molto migliori
 
-    # init search
-    slv.NewSearch(decision_builder, search_monitors)
+        # Le unita' con lo stesso prodotto e la stessa deadline sono
+        # intercambiabili: basta una catena x[i] > x[j] tra indici consecutivi
+        # del gruppo (gli altri vincoli seguono per transitivita')
 
-    # SEARCH FOR A FEASIBLE SOLUTION
-    zbest = None
-    while slv.NextSolution():
-        #
-        # PRINT SOLUTION
-        #
+        for group in units_by_dline.values():
+            for i, j in zip(group, group[1:]):
+                slv.Add(x[i] > x[j])
+
+        # Anche quando si forzano le simmetrie, la scelta influisce sulle presstazione
+        # ad esempio usare il > porta ad esploare meno branch rispetto il <
+
+        # Vincoli ridondanti sul numero di unita' entro ogni deadline
 
-        #### YOUR STUFF HERE ####
+        if counting:
+            post_deadline_counts(slv, x, z, data)
+
+        # Optional bounding constraints: the range of z is restored at the
+        # beginning of each search
+        bounds = slv.Assignment()
+        bounds.Add(z)
 
         #
-        # STORE SOLUTION VALUE
+        # THOSE ARE THE VARIABLES THAT WE WANT TO USE FOR BRANCHING
         #
-        zbest = z.Value()
+        all_vars = x
 
-        # If not in branch & bound mode, stop after a solution is found
-        if lb != None or ub != None:
-            break
+        # DEFINE THE SEARCH STRATEGY
+        decision_builder = slv.Phase(all_vars,
+                                     slv.INT_VAR_DEFAULT,
+                                     slv.INT_VALUE_DEFAULT)
+
+        self.slv = slv
+        self.x = x
+        self.z = z
+        self.bounds = bounds
+        self.decision_builder = decision_builder
+
+    #
+    # SOLVE THE MODEL
+    # time_limit, lb, ub: as in 'solve_problem'. The data is ignored (the
+    # model is already built), it is accepted so that this method can be
+    # passed as solve function to the optimization methods
+    # incumbent: value of a known solution; branch and bound then looks only
+    #            for solutions that are at least as good
+    #
+    def solve(self, data, time_limit = None, lb = None, ub = None,
+              incumbent = None):
+        slv, z = self.slv, self.z
+
+        # Optional bounding constraints (undone when the search ends)
+        if incumbent != None:
+            ub = min(ub, incumbent) if ub != None else incumbent
+            minimize = lb == None
+        else:
+            minimize = lb == None and ub == None
+        self.bounds.SetRange(z, lb if lb != None else z.Min(),
+                                ub if ub != None else z.Max())
+        decision_builder = slv.Compose([slv.RestoreAssignment(self.bounds),
+                                        self.decision_builder])
+
+        # INIT THE SEARCH PROCESS
+
+        # log monitor (just to have some feedback)
+        # search_monitors = [slv.SearchLog(500000)]
+        search_monitors = []
+        # enforce a time limit (if requested)
+        if time_limit:
+           search_monitors.append(slv.TimeLimit(time_limit))
+        # enable branch and bound
+        if minimize:
+            search_monitors.append(slv.Minimize(z, 1))
+
+        # the solver statistics are cumulative over all the searches
+        start_branches, start_time = slv.Branches(), slv.WallTime()
+        start_fails = slv.Failures()
+        # init search
+        slv.NewSearch(decision_builder, search_monitors)
+
+        # SEARCH FOR A FEASIBLE SOLUTION
+        zbest = None
+        while slv.NextSolution():
+            #
+            # PRINT SOLUTION
+            #
+
+            #### YOUR STUFF HERE ####
+
+            #
+            # STORE SOLUTION VALUE
+            #
+            zbest = z.Value()
+
+            # If not in branch & bound mode, stop after a solution is found
+            if not minimize:
+                break
+
+        # print something if no solution was found
+        if zbest == None:
+            print '*** No solution found'
+
+        # print stats
+        branches = slv.Branches() - start_branches
+        time = slv.WallTime() - start_time
+        print '*** Number of branches: %d' % branches
+        print '*** Number of fails: %d' % (slv.Failures() - start_fails)
+        print '*** Computation time: %f (ms)' % time
+        if time_limit != None and time > time_limit:
+            print '*** Time limit exceeded'
+
+        # END THE SEARCH PROCESS
+        slv.EndSearch()
 
-    # print something if no solution was found
-    if zbest == None:
-        print '*** No solution found'
+        # Return the solution value
+        return zbest, branches, time
+
+
+#
+# AN INTERVAL MODEL
+# Each unit is an interval of unit length, and a single disjunctive
+# constraint (no overlap) replaces all the != constraints. The setups become
+# transition times: a unit of p2 right after a unit of p1, with (p1, p2) in
+# 'setups', must start at least one time step after its end. The transition
+# times are enforced on the ranked sequence, hence the search ranks the
+# sequence first and then assigns the start times.
+#
+class IntervalSchedulingModel(ProductionSchedulingModel):
+    '''
+    The production scheduling model, with interval variables and transition
+    times (the 'solve' method is the same)
+    '''
+    def __init__(self, data, counting = False):
+        # Cache some useful data
+        setups = data['setups']
+        order_list = data['order_list']
+        unit_list = data['unit_list']
+        nu = len(unit_list)
+        eoh = max(o['dline'] for o in order_list)
+
+        # Units grouped by product and deadline (interchangeable)
+        units_by_dline = {}
+        for i, u in enumerate(unit_list):
+            units_by_dline.setdefault((u['prod'], u['dline']), []).append(i)
+
+        # Build solver instance
+        slv = pywrapcp.Solver('production-scheduling')
+
+        # One interval per unit: the deadline bounds the start time
+        units = [slv.FixedDurationIntervalVar(0, unit_list[i]['dline'] - 1, 1,
+                                              False, 'Prod %d' % i)
+                 for i in range(nu)]
+        x = [units[i].StartExpr().Var() for i in range(nu)]
+
+        # Objective variable: the last start time
+        z = slv.IntVar(0, eoh)
+        slv.Add(z == slv.Max(x))
+
+        # No overlap, with the setups as transition times
+        setup_pairs = set((p1, p2) for p1, p2 in setups)
+        prod = [u['prod'] for u in unit_list]
+        # (the callback must stay referenced while the solver is alive)
+        self.transition_time = lambda i, j: \
+                1 if (prod[i], prod[j]) in setup_pairs else 0
+        disjunctive = slv.DisjunctiveConstraint(units, 'units')
+        disjunctive.SetTransitionTime(self.transition_time)
+        slv.Add(disjunctive)
+
+        # Symmetry breaking, as in the base model
+        for group in units_by_dline.values():
+            for i, j in zip(group, group[1:]):
+                slv.Add(x[i] > x[j])
 
-    # print stats
-    branches, time = slv.Branches(), slv.WallTime()
-    print '*** Number of branches: %d' % branches
-    print '*** Computation time: %f (ms)' % time
-    if time_limit != None and slv.WallTime() > time_limit:
-        print '*** Time limit exceeded'
+        # Redundant deadline counts (optional)
+        if counting:
+            post_deadline_counts(slv, x, z, data)
 
-    # END THE SEARCH PROCESS
-    slv.EndSearch()
+        # Optional bounding constraints: the range of z is restored at the
+        # beginning of each search
+        bounds = slv.Assignment()
+        bounds.Add(z)
 
-    # Return the solution value
-    return zbest, branches, time
+        # DEFINE THE SEARCH STRATEGY
+        # rank the units, then schedule each of them as early as possible
+        decision_builder = slv.Compose([
+                slv.Phase([disjunctive.SequenceVar()], slv.SEQUENCE_DEFAULT),
+                slv.Phase(x, slv.CHOOSE_FIRST_UNBOUND, slv.ASSIGN_MIN_VALUE)])
 
+        self.slv = slv
+        self.x = x
+        self.z = z
+        self.bounds = bounds
+        self.decision_builder = decision_builder
 
-# LOAD PROBLEM DATA
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
 
-with open(fname) as fin:
-    data = json.load(fin)
+#
+# A TIME-INDEXED MODEL
+# One variable per time step, for the product made in it (or idle), so that
+# the units of the same product are no longer distinct (and symmetric)
+# variables: the size of the model depends on the horizon and on the number
+# of products only. The deadlines come from the units due at each time (see
+# 'unit_table'), as lower bounds on the running count of each product; the
+# setups are forbidden pairs of consecutive products.
+#
+class TimeIndexedSchedulingModel(ProductionSchedulingModel):
+    '''
+    The production scheduling model, with one variable per time step (the
+    'solve' method is the same)
+    '''
+    def __init__(self, data):
+        # Cache some useful data
+        setups = data['setups']
+        unit_list = data['unit_list']
+        due_table = unit_table(data)
+        npr = len(due_table)
+        eoh = len(due_table[0]) - 1
+        idle = npr
+
+        # Build solver instance
+        slv = pywrapcp.Solver('production-scheduling')
+
+        # y[t]: product made at time t (idle = npr)
+        y = [slv.IntVar(0, npr, 'y[%d]' % t) for t in range(eoh)]
+
+        # cnt[p][t]: units of product p made before time t, at least the
+        # units due by time t; all and only the units of p are made
+        cnt = []
+        for p in range(npr):
+            total = sum(due_table[p])
+            due = 0
+            cnt.append([])
+            for t in range(eoh + 1):
+                due += due_table[p][t]
+                cnt[p].append(slv.IntVar(due, max(due, t),
+                                         'cnt[%d,%d]' % (p,t)))
+            for t in range(eoh):
+                slv.Add(cnt[p][t + 1] == cnt[p][t] +
+                                         slv.IsEqualCstVar(y[t], p))
+            slv.Add(cnt[p][eoh] == total)
+
+        # Setups: forbidden pairs of consecutive products
+        setup_pairs = set((p1, p2) for p1, p2 in setups)
+        allowed = [(p1, p2) for p1 in range(npr + 1) for p2 in range(npr + 1)
+                   if (p1, p2) not in setup_pairs]
+        for t in range(eoh - 1):
+            slv.Add(slv.AllowedAssignments([y[t], y[t + 1]], allowed))
+
+        # Objective variable: the last busy time step
+        z = slv.IntVar(0, eoh)
+        slv.Add(z == slv.Max([t * (y[t] != idle) for t in range(eoh)]))
+
+        # Redundant constraints on the total count: at most t units before
+        # time t, and the units after time t must fit in [t, z]
+        nu = len(unit_list)
+        for t in range(1, eoh + 1):
+            made = slv.Sum([cnt[p][t] for p in range(npr)])
+            slv.Add(made <= t)
+            slv.Add(made + slv.Max(z - t + 1, 0) >= nu)
+
+        # Optional bounding constraints: the range of z is restored at the
+        # beginning of each search
+        bounds = slv.Assignment()
+        bounds.Add(z)
+
+        # DEFINE THE SEARCH STRATEGY
+        # chronological, products before idle time steps
+        decision_builder = slv.Phase(y, slv.CHOOSE_FIRST_UNBOUND,
+                                     slv.ASSIGN_MIN_VALUE)
+
+        self.slv = slv
+        self.x = y
+        self.z = z
+        self.bounds = bounds
+        self.decision_builder = decision_builder
 
 
 #
-# CALL THE SOLUTION APPROACH
+# A FUNCTION TO BUILD AND SOLVE A MODEL
+# time_limit: if None, not time limit is employed. If integer, a time limit is
+#             enforced, but optimality is no longer guaranteed!
+# lb:         lower bound
+# ub:         upper bound
+# alldiff:    how the "all different" constraint is posted (see the model)
+# engine:     'cp' (one integer variable per unit), 'interval' (interval
+#             variables and transition times, see IntervalSchedulingModel) or
+#             'time' (one variable per time step, see
+#             TimeIndexedSchedulingModel)
+# edf:        if True, the value of the EDF schedule (see 'edf_schedule') is
+#             passed to branch and bound as incumbent
+# counting:   if True, post the redundant deadline counts (ignored by the
+#             time-indexed model, that is based on counts)
+# 
+# If both 'lb' and 'ub' are None, then Branch and bound is used for optimization
 #
-# branch_and_bound(solve_problem, data)
-# destructive_lb(solve_problem, data, start = #### YOUR STUFF HERE ####)
-# destructive_ub(solve_problem, data, start = #### YOUR STUFF HERE ####)
-# binary_search(solve_problem, data,
-#               start_lb = #### YOUR STUFF HERE ####,
-#               start_ub = #### YOUR STUFF HERE ####)
\ No newline at end of file
+def solve_problem(data, time_limit = None, lb = None, ub = None,
+                  alldiff = 'pairwise', engine = 'cp', edf = False,
+                  counting = False):
+    if engine == 'interval':
+        model = IntervalSchedulingModel(data, counting = counting)
+    elif engine == 'time':
+        model = TimeIndexedSchedulingModel(data)
+    else:
+        model = ProductionSchedulingModel(data, alldiff = alldiff,
+                                          counting = counting)
+    incumbent = None
+    if edf and lb == None and ub == None:
+        heuristic = edf_schedule(data)
+        if heuristic != None:
+            incumbent = heuristic[0]
+    return model.solve(data, time_limit = time_limit, lb = lb, ub = ub,
+                       incumbent = incumbent)
+
+
+if __name__ == '__main__':
+    # LOAD PROBLEM DATA
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fname', help='data file')
+    parser.add_argument('--alldiff', choices=['pairwise', 'value', 'bounds'],
+                        default='pairwise')
+    parser.add_argument('--engine', choices=['cp', 'interval', 'time'],
+                        default='cp')
+    parser.add_argument('--method', choices=['bb', 'destructive-lb',
+                                             'destructive-ub', 'binary'],
+                        default='bb', help='optimization method')
+    parser.add_argument('--counting', action='store_true',
+                        help='post the redundant deadline counts')
+    args = parser.parse_args()
+
+    with open(args.fname) as fin:
+        data = json.load(fin)
+    if data['order_table'] != unit_table(data):
+        print '=== order_table does not match unit_list'
+        sys.exit(1)
+
+    #
+    # BOUNDS
+    #
+    # Every unit needs its own time step, plus the idle steps of the setups
+    lb = makespan_lb(data)
+    # EDF gives a feasible schedule, if it does not fail
+    heuristic = edf_schedule(data)
+    if heuristic != None:
+        print '=== EDF schedule: makespan %d' % heuristic[0]
+        ub = heuristic[0]
+    elif edf_schedule(data, setups = False) == None or \
+            any(due > slots for d, due, slots in deadline_counts(data)):
+        print '=== EDF schedule: some deadline cannot be met'
+        print 'THE PROBLEM WAS INFEASIBLE'
+        sys.exit(0)
+    else:
+        print '=== EDF schedule: not found (no upper bound)'
+        ub = None
+
+    #
+    # CALL THE SOLUTION APPROACH
+    #
+    # The model is built once and can be reused by all the probes
+    if args.engine == 'interval':
+        model = IntervalSchedulingModel(data, counting = args.counting)
+    elif args.engine == 'time':
+        model = TimeIndexedSchedulingModel(data)
+    else:
+        model = ProductionSchedulingModel(data, alldiff = args.alldiff,
+                                          counting = args.counting)
+    if args.method == 'destructive-lb':
+        eoh = max(o['dline'] for o in data['order_list'])
+        destructive_lb(model.solve, data, start = lb, max_value = eoh)
+    elif args.method == 'destructive-ub' and ub != None:
+        destructive_ub(model.solve, data, start = ub)
+    elif args.method == 'binary' and ub != None:
+        binary_search(model.solve, data, start_lb = lb - 1, start_ub = ub)
+    else:
+        # Both methods start from the value of a known solution
+        if args.method in ('destructive-ub', 'binary'):
+            print '=== No upper bound for --method=%s: using branch and ' \
+                  'bound' % args.method
+        branch_and_bound(model.solve, data, incumbent = ub)
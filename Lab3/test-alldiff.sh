@@ -0,0 +1,13 @@
+#!/usr/bin/env sh
+#
+# Compare the posting variants of the "all different" constraint
+# Usage: sh test-alldiff.sh <data dir>
+#
+
+for fname in `ls $1/*.json`; do
+	for variant in pairwise value bounds; do
+		echo "SOLVING INSTANCE $fname (--alldiff=$variant)"
+		python lab03-prod-sched.py $fname --alldiff=$variant | grep "\*\*\*"
+		echo ''
+	done
+done
@@ -0,0 +1,24 @@
+#!/usr/bin/env sh
+#
+# Check that the redundant deadline counts (--counting) do not change the
+# optimal value, with every engine, and compare the number of branches
+# Usage: sh test-counting.sh <data dir>
+# (data-test/data-sched-separators.json: the separator slot between the
+# units due by time 3 is taken by the unit due at time 4, optimum 2)
+#
+
+status=0
+for fname in `ls $1/*.json`; do
+	for engine in cp interval; do
+		plain=`python lab03-prod-sched.py $fname --engine=$engine > plain.log; grep "FINAL SOLUTION\|INFEASIBLE" plain.log`
+		counting=`python lab03-prod-sched.py $fname --engine=$engine --counting > counting.log; grep "FINAL SOLUTION\|INFEASIBLE" counting.log`
+		echo "$fname (--engine=$engine): $plain / --counting: $counting"
+		echo "  branches:`grep 'total number of branches' plain.log | cut -d: -f2` / --counting:`grep 'total number of branches' counting.log | cut -d: -f2`"
+		if [ "$plain" != "$counting" ]; then
+			echo '*** MISMATCH'
+			status=1
+		fi
+	done
+done
+rm -f plain.log counting.log
+exit $status
@@ -3,7 +3,11 @@
 #
 from ortools.constraint_solver import pywrapcp
 import sys
+import os
+import argparse
 import json
+import multiprocessing
+import timeit
 
 # BRANCH AND BOUND
 def branch_and_bound(solve_function, data,
@@ -27,7 +31,24 @@ def branch_and_bound(solve_function, data,
     print '==================================================' 
 
 
+# TIME BUDGET
+# The solution approaches below share a single time budget among all their
+# calls to the solve function: each call gets only the remaining time.
+def get_deadline(time_limit):
+    if time_limit == None:
+        return None
+    return timeit.default_timer() + time_limit / 1000.0
+
+
+# Remaining time before the deadline, in ms (None if there is no deadline)
+def remaining_time(deadline):
+    if deadline == None:
+        return None
+    return int((deadline - timeit.default_timer()) * 1000)
+
+
 # DESTRUCTIVE LOWER BOUNDING
+# Returns the solution value (None if not found) and the best lower bound
 def destructive_lb(solve_function, data, start, time_limit = None):
     print
     print '==================================================' 
@@ -36,17 +57,26 @@ def destructive_lb(solve_function, data, start, time_limit = None):
     print
     zbest = None
     branches, time = 0, 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while zbest == None:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '--------------------------------------------------' 
         print 'Checking value %d for feasibility' % start
         print
-        if time_limit != None: time_limit - time
         zbest, br, tm = solve_function(data, ub = start,
-                                       time_limit = time_limit)
+                                       time_limit = tlim)
         branches += br
         time += tm
         if zbest == None:
+            # A probe that ran out of time proves nothing
+            if tlim != None and tm >= tlim:
+                timed_out = True
+                break
             start += 1
     print
     print '==================================================' 
@@ -54,14 +84,18 @@ def destructive_lb(solve_function, data, start, time_limit = None):
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
     else:
         print 'NO SOLUTION FOUND'
+    print '- best lower bound: %d' % start
     print '- total number of branches: %d' % branches
     print '- total time (sec): %.3f' % (time / 1000.0)
-    if time_limit != None and time >= time_limit:
+    if timed_out:
         print '- TIME LIMIT EXCEEDED'
     print '==================================================' 
+    return zbest, start
 
 
 # DESTRUCTIVE UPPER BOUNDING
+# Returns the best solution value and the best lower bound (None if the
+# time budget ran out before optimality was proved)
 def destructive_ub(solve_function, data, start, time_limit = None):
     print
     print '==================================================' 
@@ -70,34 +104,48 @@ def destructive_ub(solve_function, data, start, time_limit = None):
     print
     zbest = start
     last_z = zbest
+    lb = None
     branches, time = 0, 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while last_z != None:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '--------------------------------------------------' 
         print 'Searching for a solution within cost %d' % start
         print
-        if time_limit != None: time_limit - time
         last_z, br, tm = solve_function(data, ub = start,
-                                        time_limit = time_limit)
+                                        time_limit = tlim)
         branches += br
         time += tm
         if last_z != None:
             zbest = last_z
             start = zbest - 1
+        elif tlim != None and tm >= tlim:
+            timed_out = True
+        else:
+            lb = start + 1
     print 
     print '==================================================' 
     if zbest != None:
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
     else:
         print 'NO SOLUTION FOUND'
+    if lb != None:
+        print '- best lower bound: %d' % lb
     print '- total number of branches: %d' % branches
     print '- total time (sec): %.3f' % (time / 1000.0)
-    if time_limit != None and time >= time_limit:
+    if timed_out:
         print '- TIME LIMIT EXCEEDED'
     print '==================================================' 
+    return zbest, lb
 
 
 # BINARY SEARCH
+# Returns the best solution value and the best lower bound
 def binary_search(solve_function, data, start_lb, start_ub, time_limit = None):
     print
     print '==================================================' 
@@ -106,198 +154,416 @@ def binary_search(solve_function, data, start_lb, start_ub, time_limit = None):
     print
     zbest = start_ub
     branches, time = 0, 0
-    cnt = 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while zbest > start_lb+1:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         theta = (start_lb + start_ub) / 2
         print
         print '--------------------------------------------------' 
         print 'Searching for a solution with cost in [%d..%d]' % (start_lb, theta)
         print
 
-        if cnt > 3: sys.exit()
-
-        if time_limit != None: time_limit - time
         last_z, br, tm = solve_function(data, lb = start_lb+1, ub = theta,
-                                        time_limit = time_limit)
+                                        time_limit = tlim)
         branches += br
         time += tm
         if last_z != None:
             zbest = last_z
             start_ub = zbest
         else:
-            if time_limit != None and time > time_limit:
+            if tlim != None and tm >= tlim:
+                timed_out = True
                 break
             else:
                 start_lb = theta
 
-        cnt += 1
     print 
     print '==================================================' 
     if zbest != None:
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
-        print '- best lower bound: %d' % start_lb
+        print '- best lower bound: %d' % (start_lb+1)
     else:
         print 'NO SOLUTION FOUND'
     print '- total number of branches: %d' % branches
     print '- total time (sec): %.3f' % (time / 1000.0)
-    if time_limit != None and time >= time_limit:
+    if timed_out:
         print '- TIME LIMIT EXCEEDED'
     print '==================================================' 
+    return zbest, start_lb+1
 
-#
-# A FUNCTION TO BUILD AND SOLVE A MODEL
-# time_limit: if None, not time limit is employed. If integer, a time limit is
-#             enforced, but optimality is no longer guaranteed!
-# lb:         if not None, search for a solution with cost >= lb
-# ub:         if not None, search for a solution with cost <= lb
-#
-def solve_problem(data, time_limit = None, lb = None, ub = None):
-    # Cache some useful data
-    services = data['services']
-    nservices = len(services)
-    nservers = data['nservers']
-    cap_cpu = data['cap_cpu']
-
-    # split services into individual VMs (useful for some models)
-    vm_svc = [] # service idx, for each VM
-    vm_cpu = [] # CPU requirement, for each VM
-    for k, svc in enumerate(services):
-        vm_num = svc['vm_num']
-        vm_svc += [k] * vm_num
-        vm_cpu += [svc['vm_cpu']] * vm_num
-    # total number of virtual machines
-    nvm = len(vm_svc)
-
-    # Build solver instance
-    slv = pywrapcp.Solver('production-scheduling')
-
-    # Cost variable (number of used server)
-    z = slv.IntVar(1, nservers, 'z') 
-
-    # x[i] = s, la vm i viene eseguita dal server s.
-    x = [slv.IntVar(0, nservers-1, 'vm_%d' % i) for i in range(nvm)]
-
-
-    ### Vincoli
-
-    # Lo stesso servizio su server diversi
-    for i in range(nvm):
-        for j in range(nvm):
-            #if (i != j and vm_svc[i] == vm_svc[j]):
-            #    slv.Add(x[i] != x[j])      
-            # In questo modo rompo un po' le simmetrie
-            # 2763231 branch contro 3322414
-            if (i < j and vm_svc[i] == vm_svc[j]):
-                slv.Add(x[i] < x[j])
-
-    # Taglio un po' di simmetrie, la prima vm sta nel primo server
-    slv.Add(x[0] == 0)
-
-    # Numero CPU
-    for s in range(nservers): #per ogni server
-        # se la vm viene eseguita sul server
-        # allora sommo il suo numero di CPU
-        cpu_s = sum((x[i] == s)*vm_cpu[i] for i in range(nvm)) 
-        slv.Add(cpu_s <= cap_cpu)
-
-    # Vincolo per z
-    # z e' l'indice della VM piu' alto +1
-    slv.Add(z == slv.Max([x[i]+1 for i in range(nvm)]))
-
-    # BOUNDING CONSTRAINTS (for destructive lb/ub and binary search)
-    if lb != None:
-        slv.Add(z >= lb)
-    if ub != None:
-        slv.Add(z <= ub)
-
-    all_vars = x
 
-    # DEFINE THE SEARCH STRATEGY
-    decision_builder = slv.Phase(all_vars,
-                                 slv.INT_VAR_DEFAULT,
-                                 slv.INT_VALUE_DEFAULT)
+# PARALLEL BINARY SEARCH
+# At each round, up to 'workers' thresholds in [lb+1..ub-1] are checked at
+# the same time, each one by a separate process. As soon as a probe finds a
+# solution (or proves infeasibility), the probes whose window can no longer
+# improve the bounds are cancelled. A probe that dies without an answer (e.g.
+# a crash in the solver) is a failure: it proves nothing on the bounds.
+def probe_bound(solve_function, data, lb, ub, time_limit, conn):
+    # Keep the console for the driver
+    sys.stdout = open(os.devnull, 'w')
+    conn.send(solve_function(data, lb = lb, ub = ub, time_limit = time_limit))
+    conn.close()
 
-    # INIT THE SEARCH PROCESS
-    search_monitors = []
-    if lb == None and ub == None:
-        search_monitors.append(slv.Minimize(z, 1)) #Imposto che deve minimizzare
-    # enforce a time limit (if requested)
-    if time_limit:
-       search_monitors.append(slv.TimeLimit(time_limit))
-    # init search
-    slv.NewSearch(decision_builder, search_monitors)
 
+# Returns the best solution value and the best lower bound
+def parallel_binary_search(solve_function, data, start_lb, start_ub,
+                           workers = None, time_limit = None):
+    print
+    print '==================================================' 
+    print 'Solving the problem via parallel binary search'
+    print '=================================================='
+    print
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    zbest = start_ub
+    branches, time, cancelled, failed = 0, 0, 0, 0
+    start = timeit.default_timer()
+    deadline = get_deadline(time_limit)
+    timed_out = False
+    while start_ub > start_lb+1:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
+        # Thresholds evenly spaced in the open interval (lb, ub)
+        thetas = set(start_lb + (start_ub - start_lb) * (k+1) / (workers+1)
+                     for k in range(workers))
+        thetas = sorted(t for t in thetas if start_lb < t < start_ub)
+        print
+        print '--------------------------------------------------' 
+        print 'Searching for solutions with cost in [%d..%s]' % \
+                (start_lb+1, '|'.join('%d' % t for t in thetas))
+        print
+        running = {}
+        for theta in thetas:
+            conn, child_conn = multiprocessing.Pipe(False)
+            proc = multiprocessing.Process(target=probe_bound,
+                        args=(solve_function, data, start_lb+1, theta,
+                              tlim, child_conn))
+            proc.start()
+            # Only the child writes: with our copy of its end closed, a
+            # probe that dies without sending shows up as an EOF
+            child_conn.close()
+            running[theta] = (proc, conn)
+        progress = False
+        while len(running) > 0:
+            done = [theta for theta, (probe, pipe) in running.items()
+                    if pipe.poll(0.01) or not probe.is_alive()]
+            for theta in done:
+                proc, conn = running.pop(theta)
+                try:
+                    answer = conn.recv()
+                except EOFError:
+                    answer = None
+                proc.join()
+                conn.close()
+                if answer == None:
+                    print '--- threshold %d: probe failed (exit code %s)' % \
+                            (theta, proc.exitcode)
+                    failed += 1
+                    continue
+                last_z, br, tm = answer
+                branches += br
+                time += tm
+                if last_z != None:
+                    print '--- threshold %d: solution with cost %d' % \
+                            (theta, last_z)
+                    if last_z < zbest:
+                        zbest = last_z
+                    start_ub = min(start_ub, last_z)
+                    progress = True
+                elif tlim != None and tm >= tlim:
+                    print '--- threshold %d: time limit exceeded' % theta
+                    timed_out = True
+                else:
+                    print '--- threshold %d: infeasible' % theta
+                    start_lb = max(start_lb, theta)
+                    progress = True
+            # Cancel the probes that can no longer improve the bounds (all
+            # of them, if the time budget is over)
+            over = deadline != None and remaining_time(deadline) <= 0
+            if over:
+                timed_out = True
+            for theta in running.keys():
+                if theta >= start_ub or theta <= start_lb or over:
+                    proc, conn = running.pop(theta)
+                    proc.terminate()
+                    proc.join()
+                    conn.close()
+                    cancelled += 1
+        # Stop if every probe in the round hit the time limit (or failed)
+        if not progress:
+            break
+    wall_time = timeit.default_timer() - start
+    print 
+    print '==================================================' 
+    if zbest != None:
+        print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
+        print '- best lower bound: %d' % (start_lb+1)
+    else:
+        print 'NO SOLUTION FOUND'
+    print '- total number of branches: %d' % branches
+    print '- total time (sec): %.3f' % (time / 1000.0)
+    print '- wall time (sec): %.3f' % wall_time
+    print '- cancelled probes: %d' % cancelled
+    if failed > 0:
+        print '- FAILED PROBES: %d' % failed
+    if timed_out:
+        print '- TIME LIMIT EXCEEDED'
+    print '==================================================' 
+    return zbest, start_lb+1
+
+# L2 LOWER BOUND (Martello & Toth) on the number of servers with capacity
+# 'cap' that are needed to host VMs with CPU requirements 'weights'
+def l2_bound(weights, cap):
+    best = 0
+    for k in set([0] + [w for w in weights if 2 * w <= cap]):
+        # large VMs, that cannot share a server with a VM of size k or more
+        n1 = [w for w in weights if w > cap - k]
+        # VMs larger than half the capacity: one server each
+        n2 = [w for w in weights if cap - k >= w and 2 * w > cap]
+        # small VMs (at least k): they fill the space left by n2 first
+        n3 = [w for w in weights if 2 * w <= cap and w >= k]
+        free = len(n2) * cap - sum(n2)
+        extra = max(0, (sum(n3) - free + cap - 1) // cap)
+        best = max(best, len(n1) + len(n2) + extra)
+    return best
 
-    # SEARCH FOR A FEASIBLE SOLUTION
-    zbest = None
-    while slv.NextSolution():
-        #
-        # PRINT SOLUTION
-        #
-        print '--- Solution found, time: %.3f (sec), branches: %d' % \
-                    (slv.WallTime()/1000.0, slv.Branches())
-        print '--- z: %d' % z.Value()
-
-        ### YOUR STUFF HERE ###
 
-        print 'Serv \t VM \t S '
+#
+# A REUSABLE MODEL
+# The variables and the constraints are built only once. Each call to
+# 'solve' restricts the range of the cost variable just for the duration of
+# the search (by restoring an assignment at the root of the search tree), so
+# that all the probes of the optimization methods run on the same solver.
+#
+class VMReassignmentModel(object):
+    '''
+    The VM reassignment model, built once and solved many times
+    '''
+    # capacity: how the CPU capacity constraints are posted
+    #   - sum:  one sum of reified terms for each server
+    #   - pack: a single Pack constraint, plus bin packing lower bounds
+    def __init__(self, data, capacity = 'sum'):
+        # Cache some useful data
+        services = data['services']
+        nservices = len(services)
+        nservers = data['nservers']
+        cap_cpu = data['cap_cpu']
+
+        # split services into individual VMs (useful for some models)
+        vm_svc = [] # service idx, for each VM
+        vm_cpu = [] # CPU requirement, for each VM
+        for k, svc in enumerate(services):
+            vm_num = svc['vm_num']
+            vm_svc += [k] * vm_num
+            vm_cpu += [svc['vm_cpu']] * vm_num
+        # total number of virtual machines
+        nvm = len(vm_svc)
+
+        # Build solver instance
+        slv = pywrapcp.Solver('production-scheduling')
+
+        # Cost variable (number of used server)
+        z = slv.IntVar(1, nservers, 'z') 
+
+        # x[i] = s, la vm i viene eseguita dal server s.
+        x = [slv.IntVar(0, nservers-1, 'vm_%d' % i) for i in range(nvm)]
+
+
+        ### Vincoli
+
+        # Lo stesso servizio su server diversi
         for i in range(nvm):
-            print '%d \t %d(%d) \t %d' % (vm_svc[i], i, vm_cpu[i], x[i].Value())
-        print '------------'
-        for s in range(nservers): #per ogni server
-            # se la vm viene eseguita sul server
-            # allora sommo il suo numero di CPU
-            cpu_s = 0
+            for j in range(nvm):
+                #if (i != j and vm_svc[i] == vm_svc[j]):
+                #    slv.Add(x[i] != x[j])      
+                # In questo modo rompo un po' le simmetrie
+                # 2763231 branch contro 3322414
+                if (i < j and vm_svc[i] == vm_svc[j]):
+                    slv.Add(x[i] < x[j])
+
+        # Taglio un po' di simmetrie, la prima vm sta nel primo server
+        slv.Add(x[0] == 0)
+
+        # Numero CPU
+        if capacity == 'sum':
+            for s in range(nservers): #per ogni server
+                # se la vm viene eseguita sul server
+                # allora sommo il suo numero di CPU
+                cpu_s = sum((x[i] == s)*vm_cpu[i] for i in range(nvm)) 
+                slv.Add(cpu_s <= cap_cpu)
+        else:
+            # A single Pack constraint for the loads of all the servers, plus
+            # two lower bounds on the cost: the number of used servers and the
+            # L2 bin packing bound (or the size of the largest service)
+            pack = slv.Pack(x, nservers)
+            pack.AddWeightedSumLessOrEqualConstantDimension(vm_cpu,
+                                                [cap_cpu] * nservers)
+            used = slv.IntVar(0, nservers, 'used')
+            pack.AddCountUsedBinDimension(used)
+            slv.Add(pack)
+            slv.Add(z >= used)
+            slv.Add(z >= max(l2_bound(vm_cpu, cap_cpu),
+                             max(svc['vm_num'] for svc in services)))
+
+        # Vincolo per z
+        # z e' l'indice della VM piu' alto +1
+        slv.Add(z == slv.Max([x[i]+1 for i in range(nvm)]))
+
+        # BOUNDING CONSTRAINTS (for destructive lb/ub and binary search)
+        # the range of z is restored at the beginning of each search
+        bounds = slv.Assignment()
+        bounds.Add(z)
+
+        all_vars = x
+
+        # DEFINE THE SEARCH STRATEGY
+        decision_builder = slv.Phase(all_vars,
+                                     slv.INT_VAR_DEFAULT,
+                                     slv.INT_VALUE_DEFAULT)
+
+        self.slv = slv
+        self.x = x
+        self.z = z
+        self.bounds = bounds
+        self.decision_builder = decision_builder
+        self.vm_svc = vm_svc
+        self.vm_cpu = vm_cpu
+        self.nservers = nservers
+
+    #
+    # SOLVE THE MODEL
+    # time_limit, lb, ub: as in 'solve_problem'. The data is ignored (the
+    # model is already built), it is accepted so that this method can be
+    # passed as solve function to the optimization methods
+    #
+    def solve(self, data, time_limit = None, lb = None, ub = None):
+        slv, x, z = self.slv, self.x, self.z
+        vm_svc, vm_cpu, nservers = self.vm_svc, self.vm_cpu, self.nservers
+        nvm = len(x)
+
+        # Bounding constraints (undone when the search ends)
+        self.bounds.SetRange(z, lb if lb != None else z.Min(),
+                                ub if ub != None else z.Max())
+        decision_builder = slv.Compose([slv.RestoreAssignment(self.bounds),
+                                        self.decision_builder])
+
+        # INIT THE SEARCH PROCESS
+        search_monitors = []
+        if lb == None and ub == None:
+            search_monitors.append(slv.Minimize(z, 1)) #Imposto che deve minimizzare
+        # enforce a time limit (if requested)
+        if time_limit:
+           search_monitors.append(slv.TimeLimit(time_limit))
+        # the solver statistics are cumulative over all the searches
+        start_branches, start_time = slv.Branches(), slv.WallTime()
+        # init search
+        slv.NewSearch(decision_builder, search_monitors)
+
+
+        # SEARCH FOR A FEASIBLE SOLUTION
+        zbest = None
+        while slv.NextSolution():
+            #
+            # PRINT SOLUTION
+            #
+            print '--- Solution found, time: %.3f (sec), branches: %d' % \
+                        ((slv.WallTime() - start_time)/1000.0,
+                         slv.Branches() - start_branches)
+            print '--- z: %d' % z.Value()
+
+            ### YOUR STUFF HERE ###
+
+            print 'Serv \t VM \t S '
             for i in range(nvm):
-                if x[i].Value() == s:
-                    cpu_s += vm_cpu[i]
-            print s, cpu_s
-        # STORE SOLUTION VALUE
-        zbest = z.Value()
-        # stop search if not using B&B
-        if lb != None or ub != None: break
-
-    # END THE SEARCH PROCESS
-    slv.EndSearch()
-
-    # obtain stats
-    branches, time = slv.Branches(), slv.WallTime()
-    # time capping
-    time = max(1, time)
-
-    # print stats
-    print '--- FINAL STATS'
-    if zbest == None:
-        print '--- No solution found'
-    print '--- Number of branches: %d' % branches
-    print '--- Computation time: %.3f (sec)' % (time / 1000.0)
-    if time_limit != None and slv.WallTime() > time_limit:
-        print '--- Time limit exceeded'
-
-    # Return the solution value
-    return zbest, branches, time
-
-
-# LOAD PROBLEM DATA
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
-
-with open(fname) as fin:
-    data = json.load(fin)
+                print '%d \t %d(%d) \t %d' % (vm_svc[i], i, vm_cpu[i], x[i].Value())
+            print '------------'
+            for s in range(nservers): #per ogni server
+                # se la vm viene eseguita sul server
+                # allora sommo il suo numero di CPU
+                cpu_s = 0
+                for i in range(nvm):
+                    if x[i].Value() == s:
+                        cpu_s += vm_cpu[i]
+                print s, cpu_s
+            # STORE SOLUTION VALUE
+            zbest = z.Value()
+            # stop search if not using B&B
+            if lb != None or ub != None: break
+
+        # END THE SEARCH PROCESS
+        slv.EndSearch()
+
+        # obtain stats
+        branches = slv.Branches() - start_branches
+        time = slv.WallTime() - start_time
+        # time capping
+        time = max(1, time)
+
+        # print stats
+        print '--- FINAL STATS'
+        if zbest == None:
+            print '--- No solution found'
+        print '--- Number of branches: %d' % branches
+        print '--- Computation time: %.3f (sec)' % (time / 1000.0)
+        if time_limit != None and time > time_limit:
+            print '--- Time limit exceeded'
 
+        # Return the solution value
+        return zbest, branches, time
 
-#
-# CALL THE SOLUTION APPROACH (Branch and bounds)
-#
-branch_and_bound(solve_problem, data, time_limit=15000)
 
 #
-# CALL THE SOLUTION APPROACH (Binary search)
+# A FUNCTION TO BUILD AND SOLVE A MODEL
+# time_limit: if None, not time limit is employed. If integer, a time limit is
+#             enforced, but optimality is no longer guaranteed!
+# lb:         if not None, search for a solution with cost >= lb
+# ub:         if not None, search for a solution with cost <= lb
+# capacity:   how the capacity constraints are posted ('sum' or 'pack')
 #
-# smin = min(s['vm_num'] for s in data['services'])-1
-# smax = data['nservers']
-# binary_search(solve_problem, data,
-#               start_lb = smin, start_ub = smax, time_limit = 15000)
\ No newline at end of file
+def solve_problem(data, time_limit = None, lb = None, ub = None,
+                  capacity = 'sum'):
+    model = VMReassignmentModel(data, capacity = capacity)
+    return model.solve(data, time_limit = time_limit, lb = lb, ub = ub)
+
+
+if __name__ == '__main__':
+    # LOAD PROBLEM DATA
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fname', help='data file')
+    parser.add_argument('--approach', choices=['bb', 'bs', 'pbs'],
+                        default='bb', help='branch & bound, binary search '
+                        'or parallel binary search')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='parallel probes (default: number of cores)')
+    parser.add_argument('--capacity', choices=['sum', 'pack'], default='sum',
+                        help='capacity constraints: sums or Pack')
+    args = parser.parse_args()
+
+    with open(args.fname) as fin:
+        data = json.load(fin)
+
+
+    #
+    # CALL THE SOLUTION APPROACH
+    #
+    # At least as many servers as the VMs of the largest service are needed
+    # (they go on distinct servers), hence no solution costs max(vm_num) - 1
+    smin = max(svc['vm_num'] for svc in data['services']) - 1
+    smax = data['nservers']
+    # The model is built once and reused by all the probes
+    model = VMReassignmentModel(data, capacity = args.capacity)
+    if args.approach == 'bb':
+        branch_and_bound(model.solve, data, time_limit = 15000)
+    elif args.approach == 'bs':
+        binary_search(model.solve, data,
+                      start_lb = smin, start_ub = smax, time_limit = 15000)
+    else:
+        parallel_binary_search(model.solve, data,
+                               start_lb = smin, start_ub = smax,
+                               workers = args.workers, time_limit = 15000)
@@ -3,8 +3,13 @@
 #
 from ortools.constraint_solver import pywrapcp
 import sys
+import os
+import argparse
 import json
+import multiprocessing
+import timeit
 import math
+import random
 
 # BRANCH AND BOUND
 def branch_and_bound(solve_function, data,
@@ -28,7 +33,24 @@ def branch_and_bound(solve_function, data,
     print '==================================================' 
 
 
+# TIME BUDGET
+# The solution approaches below share a single time budget among all their
+# calls to the solve function: each call gets only the remaining time.
+def get_deadline(time_limit):
+    if time_limit == None:
+        return None
+    return timeit.default_timer() + time_limit / 1000.0
+
+
+# Remaining time before the deadline, in ms (None if there is no deadline)
+def remaining_time(deadline):
+    if deadline == None:
+        return None
+    return int((deadline - timeit.default_timer()) * 1000)
+
+
 # DESTRUCTIVE LOWER BOUNDING
+# Returns the solution value (None if not found) and the best lower bound
 def destructive_lb(solve_function, data, start, time_limit = None):
     print
     print '==================================================' 
@@ -37,17 +59,26 @@ def destructive_lb(solve_function, data, start, time_limit = None):
     print
     zbest = None
     branches, time = 0, 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while zbest == None:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '--------------------------------------------------' 
         print 'Checking value %d for feasibility' % start
         print
-        if time_limit != None: time_limit - time
         zbest, br, tm = solve_function(data, ub = start,
-                                       time_limit = time_limit)
+                                       time_limit = tlim)
         branches += br
         time += tm
         if zbest == None:
+            # A probe that ran out of time proves nothing
+            if tlim != None and tm >= tlim:
+                timed_out = True
+                break
             start += 1
     print
     print '==================================================' 
@@ -55,14 +86,18 @@ def destructive_lb(solve_function, data, start, time_limit = None):
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
     else:
         print 'NO SOLUTION FOUND'
+    print '- best lower bound: %d' % start
     print '- total number of branches: %d' % branches
     print '- total time (sec): %.3f' % (time / 1000.0)
-    if time_limit != None and time >= time_limit:
+    if timed_out:
         print '- TIME LIMIT EXCEEDED'
     print '==================================================' 
+    return zbest, start
 
 
 # DESTRUCTIVE UPPER BOUNDING
+# Returns the best solution value and the best lower bound (None if the
+# time budget ran out before optimality was proved)
 def destructive_ub(solve_function, data, start, time_limit = None):
     print
     print '==================================================' 
@@ -71,34 +106,48 @@ def destructive_ub(solve_function, data, start, time_limit = None):
     print
     zbest = start
     last_z = zbest
+    lb = None
     branches, time = 0, 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while last_z != None:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         print
         print '--------------------------------------------------' 
         print 'Searching for a solution within cost %d' % start
         print
-        if time_limit != None: time_limit - time
         last_z, br, tm = solve_function(data, ub = start,
-                                        time_limit = time_limit)
+                                        time_limit = tlim)
         branches += br
         time += tm
         if last_z != None:
             zbest = last_z
             start = zbest - 1
+        elif tlim != None and tm >= tlim:
+            timed_out = True
+        else:
+            lb = start + 1
     print 
     print '==================================================' 
     if zbest != None:
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
     else:
         print 'NO SOLUTION FOUND'
+    if lb != None:
+        print '- best lower bound: %d' % lb
     print '- total number of branches: %d' % branches
     print '- total time (sec): %.3f' % (time / 1000.0)
-    if time_limit != None and time >= time_limit:
+    if timed_out:
         print '- TIME LIMIT EXCEEDED'
     print '==================================================' 
+    return zbest, lb
 
 
 # BINARY SEARCH
+# Returns the best solution value and the best lower bound
 def binary_search(solve_function, data, start_lb, start_ub, time_limit = None):
     print
     print '==================================================' 
@@ -107,201 +156,489 @@ def binary_search(solve_function, data, start_lb, start_ub, time_limit = None):
     print
     zbest = start_ub
     branches, time = 0, 0
-    cnt = 0
+    deadline = get_deadline(time_limit)
+    timed_out = False
     while zbest > start_lb+1:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
         theta = (start_lb + start_ub) / 2
         print
         print '--------------------------------------------------' 
         print 'Searching for a solution with cost in [%d..%d]' % (start_lb, theta)
         print
 
-        if cnt > 3: sys.exit()
-
-        if time_limit != None: time_limit - time
         last_z, br, tm = solve_function(data, lb = start_lb+1, ub = theta,
-                                        time_limit = time_limit)
+                                        time_limit = tlim)
         branches += br
         time += tm
         if last_z != None:
             zbest = last_z
             start_ub = zbest
         else:
-            if time_limit != None and time > time_limit:
+            if tlim != None and tm >= tlim:
+                timed_out = True
                 break
             else:
                 start_lb = theta
 
-        cnt += 1
     print 
     print '==================================================' 
     if zbest != None:
         print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
-        print '- best lower bound: %d' % start_lb
+        print '- best lower bound: %d' % (start_lb+1)
     else:
         print 'NO SOLUTION FOUND'
     print '- total number of branches: %d' % branches
     print '- total time (sec): %.3f' % (time / 1000.0)
-    if time_limit != None and time >= time_limit:
+    if timed_out:
+        print '- TIME LIMIT EXCEEDED'
+    print '==================================================' 
+    return zbest, start_lb+1
+
+
+# PARALLEL BINARY SEARCH
+# At each round, up to 'workers' thresholds in [lb+1..ub-1] are checked at
+# the same time, each one by a separate process. As soon as a probe finds a
+# solution (or proves infeasibility), the probes whose window can no longer
+# improve the bounds are cancelled. A probe that dies without an answer (e.g.
+# a crash in the solver) is a failure: it proves nothing on the bounds.
+def probe_bound(solve_function, data, lb, ub, time_limit, conn):
+    # Keep the console for the driver
+    sys.stdout = open(os.devnull, 'w')
+    conn.send(solve_function(data, lb = lb, ub = ub, time_limit = time_limit))
+    conn.close()
+
+
+# Returns the best solution value and the best lower bound
+def parallel_binary_search(solve_function, data, start_lb, start_ub,
+                           workers = None, time_limit = None):
+    print
+    print '==================================================' 
+    print 'Solving the problem via parallel binary search'
+    print '=================================================='
+    print
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    zbest = start_ub
+    branches, time, cancelled, failed = 0, 0, 0, 0
+    start = timeit.default_timer()
+    deadline = get_deadline(time_limit)
+    timed_out = False
+    while start_ub > start_lb+1:
+        tlim = remaining_time(deadline)
+        if tlim != None and tlim <= 0:
+            timed_out = True
+            break
+        # Thresholds evenly spaced in the open interval (lb, ub)
+        thetas = set(start_lb + (start_ub - start_lb) * (k+1) / (workers+1)
+                     for k in range(workers))
+        thetas = sorted(t for t in thetas if start_lb < t < start_ub)
+        print
+        print '--------------------------------------------------' 
+        print 'Searching for solutions with cost in [%d..%s]' % \
+                (start_lb+1, '|'.join('%d' % t for t in thetas))
+        print
+        running = {}
+        for theta in thetas:
+            conn, child_conn = multiprocessing.Pipe(False)
+            proc = multiprocessing.Process(target=probe_bound,
+                        args=(solve_function, data, start_lb+1, theta,
+                              tlim, child_conn))
+            proc.start()
+            # Only the child writes: with our copy of its end closed, a
+            # probe that dies without sending shows up as an EOF
+            child_conn.close()
+            running[theta] = (proc, conn)
+        progress = False
+        while len(running) > 0:
+            done = [theta for theta, (probe, pipe) in running.items()
+                    if pipe.poll(0.01) or not probe.is_alive()]
+            for theta in done:
+                proc, conn = running.pop(theta)
+                try:
+                    answer = conn.recv()
+                except EOFError:
+                    answer = None
+                proc.join()
+                conn.close()
+                if answer == None:
+                    print '--- threshold %d: probe failed (exit code %s)' % \
+                            (theta, proc.exitcode)
+                    failed += 1
+                    continue
+                last_z, br, tm = answer
+                branches += br
+                time += tm
+                if last_z != None:
+                    print '--- threshold %d: solution with cost %d' % \
+                            (theta, last_z)
+                    if last_z < zbest:
+                        zbest = last_z
+                    start_ub = min(start_ub, last_z)
+                    progress = True
+                elif tlim != None and tm >= tlim:
+                    print '--- threshold %d: time limit exceeded' % theta
+                    timed_out = True
+                else:
+                    print '--- threshold %d: infeasible' % theta
+                    start_lb = max(start_lb, theta)
+                    progress = True
+            # Cancel the probes that can no longer improve the bounds (all
+            # of them, if the time budget is over)
+            over = deadline != None and remaining_time(deadline) <= 0
+            if over:
+                timed_out = True
+            for theta in running.keys():
+                if theta >= start_ub or theta <= start_lb or over:
+                    proc, conn = running.pop(theta)
+                    proc.terminate()
+                    proc.join()
+                    conn.close()
+                    cancelled += 1
+        # Stop if every probe in the round hit the time limit (or failed)
+        if not progress:
+            break
+    wall_time = timeit.default_timer() - start
+    print 
+    print '==================================================' 
+    if zbest != None:
+        print 'THE FINAL SOLUTION VALUE IS: %d' % zbest
+        print '- best lower bound: %d' % (start_lb+1)
+    else:
+        print 'NO SOLUTION FOUND'
+    print '- total number of branches: %d' % branches
+    print '- total time (sec): %.3f' % (time / 1000.0)
+    print '- wall time (sec): %.3f' % wall_time
+    print '- cancelled probes: %d' % cancelled
+    if failed > 0:
+        print '- FAILED PROBES: %d' % failed
+    if timed_out:
         print '- TIME LIMIT EXCEEDED'
     print '==================================================' 
+    return zbest, start_lb+1
+
+# L2 LOWER BOUND (Martello & Toth) on the number of servers with capacity
+# 'cap' that are needed to host VMs with CPU requirements 'weights'
+def l2_bound(weights, cap):
+    best = 0
+    for k in set([0] + [w for w in weights if 2 * w <= cap]):
+        # large VMs, that cannot share a server with a VM of size k or more
+        n1 = [w for w in weights if w > cap - k]
+        # VMs larger than half the capacity: one server each
+        n2 = [w for w in weights if cap - k >= w and 2 * w > cap]
+        # small VMs (at least k): they fill the space left by n2 first
+        n3 = [w for w in weights if 2 * w <= cap and w >= k]
+        free = len(n2) * cap - sum(n2)
+        extra = max(0, (sum(n3) - free + cap - 1) // cap)
+        best = max(best, len(n1) + len(n2) + extra)
+    return best
+
 
 #
-# A FUNCTION TO BUILD AND SOLVE A MODEL
-# time_limit: if None, not time limit is employed. If integer, a time limit is
-#             enforced, but optimality is no longer guaranteed!
-# lb:         if not None, search for a solution with cost >= lb
-# ub:         if not None, search for a solution with cost <= lb
+# A REUSABLE MODEL
+# The variables and the constraints are built only once. Each call to
+# 'solve' restricts the range of the cost variable just for the duration of
+# the search (by restoring an assignment at the root of the search tree), so
+# that all the probes of the optimization methods run on the same solver.
 #
-def solve_problem(data, time_limit = None, lb = None, ub = None):
-    # Cache some useful data
-    services = data['services']
-    nservices = len(services)
-    nservers = data['nservers']
-    cap_cpu = data['cap_cpu']
-
-    # split services into individual VMs
-    vm_svc = [] # service idx, for each VM
-    vm_cpu = [] # CPU requirement, for each VM
-    for k, svc in enumerate(services):
-        vm_num = svc['vm_num']
-        vm_svc += [k] * vm_num
-        vm_cpu += [svc['vm_cpu']] * vm_num
-
-    nvm = len(vm_svc)
-
-
-    # Build solver instance
-    slv = pywrapcp.Solver('production-scheduling')
-
-    # Cost variable (number of used services)
-    
-    z = slv.IntVar(0, nservers, 'z')
-
-    # One variable for each VM, specifica che server esegue la vm
-    x = [slv.IntVar(0, nservers-1, 'x_%d' % i) for i in range(nvm)]
-
-    # VMs within the same service should go on different servers
-    for i in range(nvm):
-        for j in range(i+1, nvm):
-            if vm_svc[i] == vm_svc[j]:
-                #slv.Add(x[i] != x[j])
+class VMReassignmentModel(object):
+    '''
+    The VM reassignment model, built once and solved many times
+    '''
+    # capacity: how the CPU capacity constraints are posted
+    #   - sum:  one sum of reified terms for each server
+    #   - pack: a single Pack constraint, plus bin packing lower bounds
+    # restart:  None, 'luby' or 'constant' (restart monitor, with scale
+    #           restart_scale), or 'geometric' (a sequence of searches with a
+    #           failure limit that starts at restart_scale and grows by
+    #           restart_growth at each run, as in pls.py)
+    # seed:     if not None, ties in the variable selection are broken at
+    #           random. Restarts are always randomized (seed 0 by default)
+    def __init__(self, data, capacity = 'sum', restart = None,
+                 restart_scale = 100, restart_growth = 1.5, seed = None):
+        # Cache some useful data
+        services = data['services']
+        nservices = len(services)
+        nservers = data['nservers']
+        cap_cpu = data['cap_cpu']
+
+        # split services into individual VMs
+        vm_svc = [] # service idx, for each VM
+        vm_cpu = [] # CPU requirement, for each VM
+        for k, svc in enumerate(services):
+            vm_num = svc['vm_num']
+            vm_svc += [k] * vm_num
+            vm_cpu += [svc['vm_cpu']] * vm_num
+
+        nvm = len(vm_svc)
+
+
+        # Build solver instance
+        slv = pywrapcp.Solver('production-scheduling')
+
+        # Cost variable (number of used services)
+        
+        z = slv.IntVar(0, nservers, 'z')
+
+        # One variable for each VM, specifica che server esegue la vm
+        x = [slv.IntVar(0, nservers-1, 'x_%d' % i) for i in range(nvm)]
+
+        # VMs within the same service should go on different servers
+        for i in range(nvm):
+            for j in range(i+1, nvm):
+                if vm_svc[i] == vm_svc[j]:
+                    #slv.Add(x[i] != x[j])
+                    slv.Add(x[i] < x[j])
+
+        #for s in range(nservices):
+        #    vm_s = [x[i] for i in range(nvm) if vm_svc[i] == s]
+        #    print vm_s
+        #    slv.Add(slv.AllDifferent(vm_s, True))
+
+        # Taglio un po' di simmetrie, la prima vm sta nel primo server
+        slv.Add(x[0] == 0)
+
+        # Devo avere almeno tanti server quante vm ha il servizio piu' grosso
+        min_server = nservers
+        for i in range(len(services)):
+            if services[i]['vm_num'] < min_server:
+                min_server = services[i]['vm_num']
+        slv.Add(z >= min_server)
+
+        # Due Vm che richiedono piu' di meta' devono essere su server diversi
+        half_cap = cap_cpu/2
+        over_cap = [x[i] for i in range(nvm) if vm_cpu[i] > half_cap]
+        for i in range(len(over_cap)):
+            for j in range(i+1,len(over_cap)):
                 slv.Add(x[i] < x[j])
 
-    #for s in range(nservices):
-    #    vm_s = [x[i] for i in range(nvm) if vm_svc[i] == s]
-    #    print vm_s
-    #    slv.Add(slv.AllDifferent(vm_s, True))
-
-    # Taglio un po' di simmetrie, la prima vm sta nel primo server
-    slv.Add(x[0] == 0)
-
-    # Devo avere almeno tanti server quante vm ha il servizio piu' grosso
-    min_server = nservers
-    for i in range(len(services)):
-        if services[i]['vm_num'] < min_server:
-            min_server = services[i]['vm_num']
-    slv.Add(z >= min_server)
-
-    # Due Vm che richiedono piu' di meta' devono essere su server diversi
-    half_cap = cap_cpu/2
-    over_cap = [x[i] for i in range(nvm) if vm_cpu[i] > half_cap]
-    for i in range(len(over_cap)):
-        for j in range(i+1,len(over_cap)):
-            slv.Add(x[i] < x[j])
-
-    # CPU capacity constraints
-    for j in range(nservers):
-        # Obtain an expression for the total CPU requirement
-        cpu_cnt = sum(v * (x[i] == j) for i, v in enumerate(vm_cpu))
-        # Post CPU capacity constraint
-        slv.Add(cpu_cnt <= cap_cpu)
-
-    # Cost definition (exploits value symmetry)
-    slv.Add(z == 1 + slv.Max(x))
-
-    # Bounding constraints
-    if lb != None:
-        slv.Add(z >= lb)
-    if ub != None:
-        slv.Add(z <= ub)
-
-    # DEFINE THE SEARCH STRATEGY
-    decision_builder = slv.Phase(x,
-                                 slv.CHOOSE_MIN_SIZE_LOWEST_MIN,
-                                 slv.ASSIGN_MIN_VALUE)
-
-    # INIT THE SEARCH PROCESS
-    search_monitors = []
-    if lb == None and ub == None:
-        search_monitors.append(slv.Minimize(z, 1))
-    # enforce a time limit (if requested)
-    if time_limit:
-       search_monitors.append(slv.TimeLimit(time_limit))
-    # init search
-    slv.NewSearch(decision_builder, search_monitors)
-
-    #print 'vm_svc:', vm_svc
-    #print 'vm_cpu:', vm_cpu
-
-    # SEARCH FOR A FEASIBLE SOLUTION
-    zbest = None
-    while slv.NextSolution():
-        #
-        # PRINT SOLUTION
-        #
-        #print '--- Solution found, time: %.3f (sec), branches: %d' % \
-        #            (slv.WallTime()/1000.0, slv.Branches())
-        #print '--- z: %d' % z.Value()
-        #print '--- x:', ', '.join('%3d' % var.Value() for var in x)
-
-        cpu_req = [sum(v for i, v in enumerate(vm_cpu) if x[i].Value() == j)
-                    for j in range(nservers)]
-        #print '--- cpu:', ', '.join('%3d' % v for v in cpu_req)
-        #print
-
-        # STORE SOLUTION VALUE
-        zbest = z.Value()
-        # stop search if not using B&B
-        if lb != None or ub != None: break
-
-    # END THE SEARCH PROCESS
-    slv.EndSearch()
-
-    # obtain stats
-    branches, time = slv.Branches(), slv.WallTime()
-    # time capping
-    time = max(1, time)
-
-    # print stats
-    #print '--- FINAL STATS'
-    #if zbest == None:
-    #    print '--- No solution found'
-    #print '--- Number of branches: %d' % branches
-    #print '--- Computation time: %.3f (sec)' % (time / 1000.0)
-    #if time_limit != None and slv.WallTime() > time_limit:
-    #    print '--- Time limit exceeded'
-
-    # Return the solution value
-    return zbest, branches, time
-
-
-# LOAD PROBLEM DATA
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
-
-with open(fname) as fin:
-    data = json.load(fin)
+        # CPU capacity constraints
+        if capacity == 'sum':
+            for j in range(nservers):
+                # Obtain an expression for the total CPU requirement
+                cpu_cnt = sum(v * (x[i] == j) for i, v in enumerate(vm_cpu))
+                # Post CPU capacity constraint
+                slv.Add(cpu_cnt <= cap_cpu)
+        else:
+            # A single Pack constraint for the loads of all the servers, plus
+            # two lower bounds on the cost: the number of used servers and the
+            # L2 bin packing bound (or the size of the largest service)
+            pack = slv.Pack(x, nservers)
+            pack.AddWeightedSumLessOrEqualConstantDimension(vm_cpu,
+                                                [cap_cpu] * nservers)
+            used = slv.IntVar(0, nservers, 'used')
+            pack.AddCountUsedBinDimension(used)
+            slv.Add(pack)
+            slv.Add(z >= used)
+            slv.Add(z >= max(l2_bound(vm_cpu, cap_cpu),
+                             max(svc['vm_num'] for svc in services)))
+
+        # Cost definition (exploits value symmetry)
+        slv.Add(z == 1 + slv.Max(x))
+
+        # Bounding constraints: the range of z is set before each search
+        bounds = slv.Assignment()
+        bounds.Add(z)
+
+        # DEFINE THE SEARCH STRATEGY
+        # With a seed the variables are shuffled, so that the ties of
+        # CHOOSE_MIN_SIZE_LOWEST_MIN are broken at random; with restarts the
+        # values are chosen at random too, otherwise every restart would
+        # explore the same tree
+        xvars = x
+        if seed == None and restart != None:
+            seed = 0
+        if seed != None:
+            slv.ReSeed(seed)
+            xvars = list(x)
+            self.rnd = random.Random(seed)
+            self.rnd.shuffle(xvars)
+        self.xvars = xvars
+        self.val_strategy = slv.ASSIGN_MIN_VALUE if restart == None \
+                            else slv.ASSIGN_RANDOM_VALUE
+        decision_builder = slv.Phase(xvars,
+                                     slv.CHOOSE_MIN_SIZE_LOWEST_MIN,
+                                     self.val_strategy)
+
+        self.slv = slv
+        self.x = x
+        self.z = z
+        self.bounds = bounds
+        self.decision_builder = decision_builder
+        self.restart = restart
+        self.restart_scale = restart_scale
+        self.restart_growth = restart_growth
+
+    #
+    # SOLVE THE MODEL
+    # time_limit, lb, ub: as in 'solve_problem'. The data is ignored (the
+    # model is already built), it is accepted so that this method can be
+    # passed as solve function to the optimization methods
+    #
+    def solve(self, data, time_limit = None, lb = None, ub = None):
+        slv, z = self.slv, self.z
+
+        # the solver statistics are cumulative over all the searches
+        start_branches, start_time = slv.Branches(), slv.WallTime()
+        # A single search, unless geometric restarts are used. With B&B, each
+        # run looks only for solutions better than the best one so far
+        zbest = None
+        fail_limit = self.restart_scale
+        while True:
+            # Bounding constraints (undone when the search ends)
+            zmax = ub if ub != None else z.Max()
+            if zbest != None:
+                zmax = zbest - 1
+            self.bounds.SetRange(z, lb if lb != None else z.Min(), zmax)
+            decision_builder = slv.Compose([slv.RestoreAssignment(self.bounds),
+                                            self.decision_builder])
+
+            # INIT THE SEARCH PROCESS
+            search_monitors = []
+            if lb == None and ub == None:
+                search_monitors.append(slv.Minimize(z, 1))
+            if self.restart == 'luby':
+                search_monitors.append(slv.LubyRestart(self.restart_scale))
+            elif self.restart == 'constant':
+                search_monitors.append(slv.ConstantRestart(self.restart_scale))
+            elif self.restart == 'geometric':
+                search_monitors.append(slv.FailuresLimit(int(fail_limit)))
+            # enforce a time limit (if requested)
+            if time_limit:
+                tlim = time_limit - (slv.WallTime() - start_time)
+                if tlim <= 0:
+                    break
+                search_monitors.append(slv.TimeLimit(tlim))
+            # init search
+            start_failures = slv.Failures()
+            slv.NewSearch(decision_builder, search_monitors)
+
+            # SEARCH FOR A FEASIBLE SOLUTION
+            zrun = self.search_solutions(lb, ub)
+            if zrun != None:
+                zbest = zrun
+
+            # END THE SEARCH PROCESS
+            slv.EndSearch()
+
+            # Stop if the search was complete, or if a probe found a solution
+            if self.restart != 'geometric' or \
+                    slv.Failures() - start_failures < fail_limit or \
+                    (zbest != None and (lb != None or ub != None)):
+                break
+            # Next run: larger limit, new random tie-breaking
+            fail_limit *= self.restart_growth
+            self.rnd.shuffle(self.xvars)
+            self.decision_builder = slv.Phase(self.xvars,
+                                              slv.CHOOSE_MIN_SIZE_LOWEST_MIN,
+                                              self.val_strategy)
+
+        # obtain stats
+        branches = slv.Branches() - start_branches
+        time = slv.WallTime() - start_time
+        # time capping
+        time = max(1, time)
+
+        # print stats
+        #print '--- FINAL STATS'
+        #if zbest == None:
+        #    print '--- No solution found'
+        #print '--- Number of branches: %d' % branches
+        #print '--- Computation time: %.3f (sec)' % (time / 1000.0)
+        #if time_limit != None and time > time_limit:
+        #    print '--- Time limit exceeded'
+
+        # Return the solution value
+        return zbest, branches, time
+
+    # Run the search started by 'solve'. Returns the value of the last
+    # solution found (None if there is none)
+    def search_solutions(self, lb, ub):
+        slv, z = self.slv, self.z
+
+        #print 'vm_svc:', vm_svc
+        #print 'vm_cpu:', vm_cpu
+
+        zbest = None
+        while slv.NextSolution():
+            #
+            # PRINT SOLUTION
+            #
+            #print '--- Solution found, time: %.3f (sec), branches: %d' % \
+            #            ((slv.WallTime() - start_time)/1000.0,
+            #             slv.Branches() - start_branches)
+            #print '--- z: %d' % z.Value()
+            #print '--- x:', ', '.join('%3d' % var.Value() for var in x)
+            #print
+
+            # STORE SOLUTION VALUE
+            zbest = z.Value()
+            # stop search if not using B&B
+            if lb != None or ub != None: break
+        return zbest
 
 
 #
-# CALL THE SOLUTION APPROACH
+# A FUNCTION TO BUILD AND SOLVE A MODEL
+# time_limit: if None, not time limit is employed. If integer, a time limit is
+#             enforced, but optimality is no longer guaranteed!
+# lb:         if not None, search for a solution with cost >= lb
+# ub:         if not None, search for a solution with cost <= lb
+# capacity:   how the capacity constraints are posted ('sum' or 'pack')
+# restart, restart_growth, seed: restart strategy and seed (see
+#             VMReassignmentModel)
 #
-branch_and_bound(solve_problem, data, time_limit=15000)
-
-# smin = min(svc['vm_num'] for svc in data['services'])
-# smax = data['nservers']
-# binary_search(solve_problem, data,
-#               start_lb = smin, start_ub = smax, time_limit = 15000)
\ No newline at end of file
+def solve_problem(data, time_limit = None, lb = None, ub = None,
+                  capacity = 'sum', restart = None, restart_growth = 1.5,
+                  seed = None):
+    model = VMReassignmentModel(data, capacity = capacity, restart = restart,
+                                restart_growth = restart_growth, seed = seed)
+    return model.solve(data, time_limit = time_limit, lb = lb, ub = ub)
+
+
+if __name__ == '__main__':
+    # LOAD PROBLEM DATA
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fname', help='data file')
+    parser.add_argument('--approach', choices=['bb', 'bs', 'pbs'],
+                        default='bb', help='branch & bound, binary search '
+                        'or parallel binary search')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='parallel probes (default: number of cores)')
+    parser.add_argument('--capacity', choices=['sum', 'pack'], default='sum',
+                        help='capacity constraints: sums or Pack')
+    parser.add_argument('--restart', choices=['luby', 'constant', 'geometric'],
+                        default=None, help='restart strategy (default: none)')
+    parser.add_argument('--restart-growth', type=float, default=1.5,
+                        help='growth of the failure limit (geometric restarts)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the random tie-breaking')
+    args = parser.parse_args()
+
+    with open(args.fname) as fin:
+        data = json.load(fin)
+
+
+    #
+    # CALL THE SOLUTION APPROACH
+    #
+    # At least as many servers as the VMs of the largest service are needed
+    # (they go on distinct servers), hence no solution costs max(vm_num) - 1
+    smin = max(svc['vm_num'] for svc in data['services']) - 1
+    smax = data['nservers']
+    # The model is built once and reused by all the probes
+    model = VMReassignmentModel(data, capacity = args.capacity,
+                                restart = args.restart,
+                                restart_growth = args.restart_growth,
+                                seed = args.seed)
+    if args.approach == 'bb':
+        branch_and_bound(model.solve, data, time_limit = 15000)
+    elif args.approach == 'bs':
+        binary_search(model.solve, data,
+                      start_lb = smin, start_ub = smax, time_limit = 15000)
+    else:
+        parallel_binary_search(model.solve, data,
+                               start_lb = smin, start_ub = smax,
+                               workers = args.workers, time_limit = 15000)
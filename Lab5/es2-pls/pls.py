@@ -2,25 +2,94 @@
 # IMPORT THE OR-TOOLS CONSTRAINT SOLVER
 #
 from ortools.constraint_solver import pywrapcp
-import sys
 import json
 import math
+import argparse
+import random
+import multiprocessing
+import timeit
+import numpy as np
 
 #
-# A FUNCTION TO BUILD AND SOLVE A MODEL
-# time_limit: if None, not time limit is employed. If integer, a time limit is
-#             enforced, but optimality is no longer guaranteed!
+# PREPROCESSING
+# The candidate values of each cell are kept in a n x n x n boolean cube
+# (cand[i,j,v] is true if cell (i,j) can take value v) and reduced, until a
+# fixed point is reached, by:
+# - naked singles: a cell with a single candidate takes that value, which
+#   is removed from the other cells of its row and column
+# - hidden singles: a value with a single candidate cell in a row (column)
+#   goes in that cell, whose other candidates are removed
+# Returns the candidate cube, or None if some cell has no candidate left or
+# some value cannot be placed in a row or column (i.e. no solution exists)
+#
+def preprocess(matrix):
+    n = len(matrix)
+    m = np.array(matrix)
+    cand = np.ones((n, n, n), dtype=bool)
+    cand[m >= 0] = False
+    rows, cols = np.nonzero(m >= 0)
+    cand[rows, cols, m[rows, cols]] = True
+
+    while True:
+        size = cand.sum(axis=2)
+        if (size == 0).any():
+            return None
+        # Naked singles
+        fixed = cand & (size == 1)[:, :, np.newaxis]
+        row_fixed = fixed.sum(axis=1) # row_fixed[i,v]: cells with value v
+        col_fixed = fixed.sum(axis=0) # col_fixed[j,v]: cells with value v
+        if (row_fixed > 1).any() or (col_fixed > 1).any():
+            return None
+        new = cand & ~((row_fixed > 0)[:, np.newaxis, :] & ~fixed)
+        new &= ~((col_fixed > 0)[np.newaxis, :, :] & ~fixed)
+        # Hidden singles
+        row_cnt = new.sum(axis=1) # row_cnt[i,v]: candidate cells for v
+        col_cnt = new.sum(axis=0) # col_cnt[j,v]: candidate cells for v
+        if (row_cnt == 0).any() or (col_cnt == 0).any():
+            return None
+        hidden = new & ((row_cnt == 1)[:, np.newaxis, :] |
+                        (col_cnt == 1)[np.newaxis, :, :])
+        nhidden = hidden.sum(axis=2)
+        if (nhidden > 1).any():
+            return None
+        new[nhidden == 1] = hidden[nhidden == 1]
+        if (new == cand).all():
+            return cand
+        cand = new
+
+
 #
-def solve_problem(data, time_limit = None):
+# BUILD AND SOLVE THE MODEL (without printing anything)
+# Arguments as in 'solve_problem'. Returns the solution (a list of rows, or
+# None), the number of branches, the computation time and the number of runs
+# (0 if the preprocessing proves that there is no solution)
+#
+def search(data, time_limit = None, restart = None, restart_scale = 100,
+           restart_growth = 1.5, seed = None, strategy = 'maxval',
+           preprocessing = True, model = 'primal', branch = 'primal'):
     # Cache some useful data
     matrix = data['matrix']
     n = len(matrix)
 
+    # Reduce the domains before building the model
+    start = timeit.default_timer()
+    if preprocessing:
+        cand = preprocess(matrix)
+        if cand is None:
+            time = int(1000 * (timeit.default_timer() - start))
+            return None, 0, max(1, time), 0
+    else:
+        cand = np.ones((n, n, n), dtype=bool)
+    prep_time = int(1000 * (timeit.default_timer() - start))
+    if time_limit:
+        time_limit = max(1, time_limit - prep_time)
+
     # Build solver instance
     slv = pywrapcp.Solver('production-scheduling')
 
     # One variable for each cell
-    x = {(i,j) : slv.IntVar(0, n-1, 'x[%d,%d]' % (i,j)) for i in range(n)
+    x = {(i,j) : slv.IntVar(np.flatnonzero(cand[i,j]).tolist(),
+                            'x[%d,%d]' % (i,j)) for i in range(n)
                                                 for j in range(n)}
 
     # All different values on each row
@@ -39,66 +108,330 @@ def solve_problem(data, time_limit = None):
             if matrix[i][j] >= 0:
                 slv.Add(x[i,j] == matrix[i][j])
 
-    # DEFINE THE SEARCH STRATEGY
-    decision_builder = slv.Phase(x.values(),
-                                 slv.CHOOSE_MIN_SIZE_LOWEST_MIN, # scelgo la variabile e il valore che 
-                                 slv.ASSIGN_MAX_VALUE)           # e' piu' facile che porti ad una sol. infeasible
+    # CHANNELED MODEL
+    # Two more viewpoints: r[i,v] is the column of value v in row i, c[j,v]
+    # is the row of value v in column j. Each row, column and value is a
+    # permutation, and the three viewpoints are linked by inverse constraints
+    # (x[i,j] == v <=> r[i,v] == j <=> c[j,v] == i)
+    channeled = model == 'channeled' or branch != 'primal'
+    if channeled:
+        r = {(i,v) : slv.IntVar(np.flatnonzero(cand[i,:,v]).tolist(),
+                                'r[%d,%d]' % (i,v)) for i in range(n)
+                                                    for v in range(n)}
+        c = {(j,v) : slv.IntVar(np.flatnonzero(cand[:,j,v]).tolist(),
+                                'c[%d,%d]' % (j,v)) for j in range(n)
+                                                    for v in range(n)}
+        for i in range(n):
+            slv.Add(slv.InversePermutationConstraint(
+                        [x[i,j] for j in range(n)], [r[i,v] for v in range(n)]))
+        for j in range(n):
+            slv.Add(slv.InversePermutationConstraint(
+                        [x[i,j] for i in range(n)], [c[j,v] for v in range(n)]))
+        for v in range(n):
+            slv.Add(slv.InversePermutationConstraint(
+                        [r[i,v] for i in range(n)], [c[j,v] for j in range(n)]))
+
+    # Branching variables: the cells ('primal'), the row-value and
+    # column-value variables ('dual') or all of them ('all')
+    xvars = []
+    if branch == 'primal' and seed == None and restart == None:
+        xvars = x.values()
+    elif branch in ('primal', 'all'):
+        xvars += [x[i,j] for i in range(n) for j in range(n)]
+    if branch in ('dual', 'all'):
+        xvars += [r[i,v] for i in range(n) for v in range(n)]
+        xvars += [c[j,v] for j in range(n) for v in range(n)]
+    # The cells are fixed by the channeling once the dual variables are, but
+    # a last phase on them keeps the solution complete in any case
+    xlast = [x[i,j] for i in range(n) for j in range(n)]
 
-    # INIT THE SEARCH PROCESS
-    search_monitors = []
-    # enforce a time limit (if requested)
-    if time_limit:
-       search_monitors.append(slv.TimeLimit(time_limit))
-    # init search
-    slv.NewSearch(decision_builder, search_monitors)
+    # RANDOMIZATION
+    # The variables are shuffled, so that the ties of CHOOSE_MIN_SIZE_LOWEST_MIN
+    # are broken at random; with the restart monitors, which restart the same
+    # decision builder, the values are chosen at random as well
+    if seed == None and restart != None:
+        seed = 0
+    if seed != None:
+        rnd = random.Random(seed)
+        slv.ReSeed(seed)
+        rnd.shuffle(xvars)
+    if restart in ('luby', 'constant'):
+        val_strategy = slv.ASSIGN_RANDOM_VALUE
+    elif strategy == 'minval':
+        val_strategy = slv.ASSIGN_MIN_VALUE
+    else:
+        val_strategy = slv.ASSIGN_MAX_VALUE
 
     # SEARCH FOR A FEASIBLE SOLUTION
-    sol_found = False
-    while slv.NextSolution():
-        sol_found = True
-        #
-        # PRINT SOLUTION
-        #
-        for i in range(n):
-            print ' '.join('%2d' % x[i,j].Value() for j in range(n))
-        print
-        break
+    # A single search, unless geometric restarts are used
+    sol = None
+    runs = 0
+    fail_limit = restart_scale
+    while True:
+        # DEFINE THE SEARCH STRATEGY
+        if strategy == 'impact':
+            # impact based search (the built-in default strategy)
+            decision_builder = slv.DefaultPhase(xvars)
+        else:
+            decision_builder = slv.Phase(xvars,
+                                     slv.CHOOSE_MIN_SIZE_LOWEST_MIN, # scelgo la variabile e il valore che 
+                                     val_strategy)                   # e' piu' facile che porti ad una sol. infeasible
+        if branch != 'primal':
+            decision_builder = slv.Compose([decision_builder,
+                            slv.Phase(xlast, slv.CHOOSE_FIRST_UNBOUND,
+                                      slv.ASSIGN_MIN_VALUE)])
 
-    # END THE SEARCH PROCESS
-    slv.EndSearch()
+        # INIT THE SEARCH PROCESS
+        search_monitors = []
+        if restart == 'luby':
+            search_monitors.append(slv.LubyRestart(restart_scale))
+        elif restart == 'constant':
+            search_monitors.append(slv.ConstantRestart(restart_scale))
+        elif restart == 'geometric':
+            search_monitors.append(slv.FailuresLimit(int(fail_limit)))
+        # enforce a time limit (if requested)
+        if time_limit:
+            tlim = time_limit - slv.WallTime()
+            if tlim <= 0:
+                break
+            search_monitors.append(slv.TimeLimit(tlim))
+        # init search
+        start_failures = slv.Failures()
+        slv.NewSearch(decision_builder, search_monitors)
+        runs += 1
 
-    if not sol_found:
-        print '--- No solution found'
-        print 
+        if slv.NextSolution():
+            sol = [[x[i,j].Value() for j in range(n)] for i in range(n)]
+
+        # END THE SEARCH PROCESS
+        slv.EndSearch()
+
+        # Stop if a solution was found, or if the search was complete
+        if sol != None or restart != 'geometric' or \
+                slv.Failures() - start_failures < fail_limit:
+            break
+        # Next run: larger limit, new random tie-breaking
+        fail_limit *= restart_growth
+        rnd.shuffle(xvars)
 
     # obtain stats
-    branches, time = slv.Branches(), slv.WallTime()
+    branches, time = slv.Branches(), slv.WallTime() + prep_time
     # time capping
     time = max(1, time)
+    return sol, branches, time, runs
+
+
+# Print a solution
+def print_solution(sol):
+    for row in sol:
+        print ' '.join('%2d' % v for v in row)
+    print
+
+
+#
+# A FUNCTION TO BUILD AND SOLVE A MODEL
+# time_limit: if None, not time limit is employed. If integer, a time limit is
+#             enforced, but optimality is no longer guaranteed!
+# restart:    None, 'luby', 'constant' or 'geometric'. The first two use the
+#             restart monitors of the solver; geometric restarts are obtained
+#             by a sequence of searches with a failure limit that grows by
+#             restart_growth at each run
+# restart_scale: failures before the first restart (scale of the sequence)
+# seed:       if not None, ties in the variable selection are broken at
+#             random. Restarts are always randomized (seed 0 by default),
+#             otherwise they would explore the same tree over and over
+# strategy:   'maxval' (min size, max value), 'minval' (min size, min value)
+#             or 'impact' (impact based search)
+# preprocessing: if True, the domains are reduced before the search (see
+#             'preprocess')
+# model:      'primal' (one variable per cell) or 'channeled' (the cells plus
+#             the row-value and column-value viewpoints, see 'search')
+# branch:     branch on the 'primal' variables, on the 'dual' ones or on
+#             'all' of them; the last two imply the channeled model
+# race:       if not None, race this number of strategies in parallel (see
+#             'race_portfolio', 0 means one per core); the other arguments
+#             are then ignored
+#
+def solve_problem(data, time_limit = None, restart = None,
+                  restart_scale = 100, restart_growth = 1.5, seed = None,
+                  strategy = 'maxval', preprocessing = True,
+                  model = 'primal', branch = 'primal', race = None):
+    if race != None:
+        return race_portfolio(data, time_limit, race)
+
+    sol, branches, time, runs = search(data, time_limit, restart,
+                        restart_scale, restart_growth, seed, strategy,
+                        preprocessing, model, branch)
+
+    if sol != None:
+        #
+        # PRINT SOLUTION
+        #
+        print_solution(sol)
+    else:
+        print '--- No solution found'
+        if runs == 0:
+            print '--- (infeasibility proved by the preprocessing)'
+        print
 
     # print stats
     print '--- FINAL STATS'
     print '--- Number of branches: %d' % branches
+    if restart == 'geometric':
+        print '--- Number of runs: %d' % runs
     print '--- Computation time: %.3f (sec)' % (time / 1000.0)
-    if time_limit != None and slv.WallTime() > time_limit:
+    if time_limit != None and time > time_limit:
         print '--- Time limit exceeded'
 
     # Return the solution value
     return branches, time
 
 
-# LOAD PROBLEM DATA
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
+#
+# PARALLEL PORTFOLIO
+# Only one solution is needed, hence several strategies can race on the same
+# instance: the first process that finds a solution (or proves that there is
+# none) wins and the others are terminated.
+#
 
-with open(fname) as fin:
-    data = json.load(fin)
+# The strategies: a few fixed ones, then randomized searches with geometric
+# restarts, each with its own seed
+def portfolio(size):
+    configs = [dict(strategy = 'maxval'),
+               dict(strategy = 'impact', seed = 0),
+               dict(strategy = 'maxval', restart = 'geometric', seed = 0),
+               dict(strategy = 'maxval', restart = 'luby', seed = 0),
+               dict(strategy = 'minval', seed = 0)]
+    for seed in range(1, size):
+        configs.append(dict(strategy = 'maxval', restart = 'geometric',
+                            seed = seed))
+    return configs[:size]
 
 
-#
-# CALL THE SOLUTION APPROACH
-#
-solve_problem(data, time_limit=20000)
\ No newline at end of file
+def config_name(config):
+    return ', '.join('%s=%s' % (k, config[k]) for k in sorted(config))
+
+
+def race_worker(data, time_limit, config, conn):
+    conn.send(search(data, time_limit, **config))
+    conn.close()
+
+
+# Returns the branches and the computation time of the winner (the wall time
+# of the race is printed as well). The strategies run in child processes,
+# hence the race cannot start from a daemonic process (e.g. a worker of
+# batch-solve.py)
+def race_portfolio(data, time_limit = None, workers = None):
+    if multiprocessing.current_process().daemon:
+        raise ValueError('race cannot run in a daemonic process '
+                         '(e.g. under batch-solve.py)')
+    if workers == None or workers <= 0:
+        workers = multiprocessing.cpu_count()
+    print '=================================================='
+    print 'Racing %d strategies' % workers
+    print '=================================================='
+    start = timeit.default_timer()
+    running = {}
+    for k, config in enumerate(portfolio(workers)):
+        conn, child_conn = multiprocessing.Pipe(False)
+        proc = multiprocessing.Process(target=race_worker,
+                    args=(data, time_limit, config, child_conn))
+        proc.start()
+        # Only the child writes: with our copy of its end closed, a worker
+        # that dies without sending shows up as an EOF
+        child_conn.close()
+        running[k] = (proc, conn, config)
+    winner = None
+    failed = 0
+    while len(running) > 0 and winner == None:
+        done = [k for k, (worker, pipe, config) in running.items()
+                if pipe.poll(0.01) or not worker.is_alive()]
+        for k in done:
+            proc, conn, config = running.pop(k)
+            try:
+                answer = conn.recv()
+            except EOFError:
+                answer = None
+            proc.join()
+            conn.close()
+            # A crashed strategy is out of the race
+            if answer == None:
+                print '--- Strategy failed (exit code %s): %s' % \
+                        (proc.exitcode, config_name(config))
+                failed += 1
+                continue
+            sol, branches, time, runs = answer
+            # A complete search without solutions is a proof as well
+            if sol != None or time_limit == None or time < time_limit:
+                winner = (config, sol, branches, time)
+                break
+    # Cancel the other strategies
+    for k, (proc, conn, config) in running.items():
+        proc.terminate()
+        proc.join()
+        conn.close()
+    wall_time = timeit.default_timer() - start
+
+    if winner != None:
+        config, sol, branches, time = winner
+        if sol != None:
+            print_solution(sol)
+        else:
+            print '--- The problem is infeasible'
+            print
+        print '--- Winning strategy: %s' % config_name(config)
+    else:
+        # Every strategy hit the time limit (or failed)
+        branches, time = 0, int(1000 * wall_time)
+        print '--- No solution found'
+        if failed < workers:
+            print '--- Time limit exceeded'
+        print
+
+    # print stats
+    print '--- FINAL STATS'
+    print '--- Number of branches: %d' % branches
+    print '--- Computation time: %.3f (sec)' % (time / 1000.0)
+    print '--- Wall time: %.3f (sec)' % wall_time
+    print '--- Cancelled strategies: %d' % len(running)
+    if failed > 0:
+        print '--- FAILED STRATEGIES: %d' % failed
+
+    return branches, time
+
+
+if __name__ == '__main__':
+    # LOAD PROBLEM DATA
+    parser = argparse.ArgumentParser(description='Partial Latin Square')
+    parser.add_argument('fname', help='data file')
+    parser.add_argument('--restart', choices=['luby', 'constant', 'geometric'],
+                        default=None, help='restart strategy (default: none)')
+    parser.add_argument('--restart-scale', type=int, default=100,
+                        help='failures before the first restart')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the random tie-breaking')
+    parser.add_argument('--strategy', choices=['maxval', 'minval', 'impact'],
+                        default='maxval', help='search strategy')
+    parser.add_argument('--no-preprocessing', action='store_true',
+                        help='do not reduce the domains before the search')
+    parser.add_argument('--model', choices=['primal', 'channeled'],
+                        default='primal', help='model (default: primal)')
+    parser.add_argument('--branch', choices=['primal', 'dual', 'all'],
+                        default='primal', help='branching variables')
+    parser.add_argument('--race', type=int, default=None, metavar='N',
+                        help='race N strategies in parallel (0: #cores)')
+    args = parser.parse_args()
+    fname = args.fname
+
+    with open(fname) as fin:
+        data = json.load(fin)
+
+
+    #
+    # CALL THE SOLUTION APPROACH
+    #
+    solve_problem(data, time_limit=20000, restart=args.restart,
+                  restart_scale=args.restart_scale, seed=args.seed,
+                  strategy=args.strategy,
+                  preprocessing=not args.no_preprocessing,
+                  model=args.model, branch=args.branch, race=args.race)
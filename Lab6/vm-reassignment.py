@@ -7,190 +7,233 @@ from ortools.constraint_solver import pywrapcp
 import sys
 import json
 import math
+import argparse
+import random
+import os
+# The helpers shared by the labs are in the root of the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from search_utils import get_domain
 
 
-def filter_max(idx_value_pairs):
-    thr = None
-    res = []
-    for i, v in idx_value_pairs.items():
-        if thr is None or v == thr:
-            thr = v
-            res.append(i)
-        elif v > thr:
-            thr = v
-            res = [i]
-    return res
-
-
-def filter_min(idx_value_pairs):
-    thr = None
-    res = []
-    for i, v in idx_value_pairs.items():
-        if thr is None or v == thr:
-            thr = v
-            res.append(i)
-        elif v < thr:
-            thr = v
-            res = [i]
-    return res
-
-
-def filter_by_idx(values, idx):
-    return [values[i] for i in idx]
-
-
-def get_domain(var):
-    return [j for j in range(var.Min(), var.Max()+1) if var.Contains(j)]
- #
-
 class MaxRequestFirstDecisionBuilder(pywrapcp.PyDecisionBuilder):
   '''
   A dedicated DecisionBuilder for our problem
+
+  The state of the search is not recomputed at each decision:
+  - the branching order of the VMs is static, so the next VM to branch on
+    is found by moving a reversible pointer past the bound VMs
+  - the load on each server is read from the load variables, which are
+    maintained (and restored on backtracking) by the solver
   '''
-  def __init__(self, x, req,vm_svc, svc_vm, cap, nservers):
+  def __init__(self, x, req,vm_svc, svc_vm, cap, nservers, load,
+               fix_first = True):
+    pywrapcp.PyDecisionBuilder.__init__(self)
     self.x = x
     self.req = req
     self.vm_svc = vm_svc    # vm_svc[i] = k --> la vm i si è del service k
     self.svc_vm = svc_vm    # svc_vm[k] = n --> il service k ha n vm
     self.cap = cap
     self.nservers = nservers
-    self.MAX_VALUE = 1000
+    self.load = load        # load[j] = CPU delle vm assegnate al server j
+    # Scelgo prima le VM con maggior richiesta di CPU e, a parita', quelle
+    # dei service con il maggior numero di vm (poi in ordine di indice)
+    self.order = sorted(range(len(x)),
+                        key=lambda i: (-req[i], -svc_vm[vm_svc[i]], i))
+    # Posizione in self.order della prima VM non assegnata: tutte le VM
+    # che la precedono sono assegnate
+    self.next_pos = pywrapcp.RevInteger(0)
+    # Vero dopo la prima decisione (se fix_first e' falso, la prima VM non
+    # viene messa sul server 0, ad es. perche' alcune VM sono gia' assegnate)
+    self.started = pywrapcp.RevBool(not fix_first)
 
   def Next(self, slv):
-    # Compute a number of useful pieces of infomation
-    # - load on each server
-    # - list of unbound variables
-    load = [0 for j in range(self.nservers)]
-    unbound_idx = []
-    for i, var in enumerate(self.x):
-        if var.Bound():
-            load[var.Value()] += self.req[i]
-        else:
-            unbound_idx.append(i)
+    # Skip the VMs that have been bound since the last decision (either by
+    # branching or by propagation)
+    pos = self.next_pos.Value()
+    while pos < len(self.order) and self.x[self.order[pos]].Bound():
+        pos += 1
+    self.next_pos.SetValue(slv, pos)
 
     # If all variables are bound, then stop search
-    if len(unbound_idx) == 0:
+    if pos == len(self.order):
         return None
 
-    # Scelgo tra le variabili che hanno maggior richieste di CPU
-    candidates = filter_max({i:self.req[i] for i in unbound_idx})
-    # Tra quelle che hanno la maggior richiesta, prendo quelle che hanno il maggiorn numero di vm
-    candidates = filter_max({i: self.svc_vm[self.vm_svc[i]] for i in candidates})
-
-    sel_var_idx = candidates[0]
+    sel_var_idx = self.order[pos]
     sel_var = self.x[sel_var_idx]
 
     # Controllo se ho già fatto delle assegnazioni
-    if len(unbound_idx) == len(self.req):
+    if not self.started.Value():
         # Non sono ancora state assegnati dei valori
+        self.started.SetValue(slv, True)
         return slv.AssignVariableValueOrFail(sel_var, 0) # un server vale l'altro
 
-        ## trova il service della VM
-        ## sel_var_idx è l'indice della prima VM del service (perché è il primo assegnamento)
-        #service = self.vm_svc[sel_var_idx]
-        ## seleziona tutte le Vm del service
-        #vms = [self.x[i] for i in range(sel_var_idx, sel_var_idx+self.svc_vm[service])]
-        #vals = [i for i in range(len(vms))]
-        #
-        ## esegue l'assegnamento in blocco
-        #if len(vms) > nservers:
-        #    return None # problema infeasible
-        #else:
-        #    # MakeAssignVariablesValues (const IntVar *const *vars, int size, const int64 *const values)
-        #    return slv.AssignVariablesValues(vms, len(vms),vals)
-
+    # Viene messa sul primo server best-fit, ossia quello con il carico
+    # maggiore tra quelli che possono ancora ospitare la VM (se non ce ne
+    # sono, il primo server del dominio)
+    vm_request = self.req[sel_var_idx]
+    sel_val, sel_load = None, -1
+    for server in get_domain(sel_var):
+        load = self.load[server].Min()
+        if sel_val is None:
+            sel_val = server
+        if load > sel_load and load + vm_request <= self.cap:
+            sel_val, sel_load = server, load
+
+    # se il server a cui assegnare la variabile è vuoto, faccio probing
+    if self.load[sel_val].Min() == 0:
+        return slv.AssignVariableValueOrFail(sel_var, sel_val)
     else:
-        # Identify the possible values
-        values = get_domain(sel_var) # lista di interi
-        
-        # Viene messa sul primo server best-fit
-        vm_idx = sel_var_idx
-        vm_request = self.req[vm_idx]
-
-        excess = []
-        for server in values:
-            exc = self.cap - (load[server] + vm_request)
-            if (exc >= 0):
-                excess.append(exc)
-            else:
-                excess.append(self.MAX_VALUE) # valore farlocco, prendo il minimo eccesso
+        return slv.AssignVariableValue(sel_var, sel_val)
+
+# L2 LOWER BOUND (Martello & Toth) on the number of servers with capacity
+# 'cap' that are needed to host VMs with CPU requirements 'weights'
+def l2_bound(weights, cap):
+    best = 0
+    for k in set([0] + [w for w in weights if 2 * w <= cap]):
+        # large VMs, that cannot share a server with a VM of size k or more
+        n1 = [w for w in weights if w > cap - k]
+        # VMs larger than half the capacity: one server each
+        n2 = [w for w in weights if cap - k >= w and 2 * w > cap]
+        # small VMs (at least k): they fill the space left by n2 first
+        n3 = [w for w in weights if 2 * w <= cap and w >= k]
+        free = len(n2) * cap - sum(n2)
+        extra = max(0, (sum(n3) - free + cap - 1) // cap)
+        best = max(best, len(n1) + len(n2) + extra)
+    return best
+
+#
+# THE VM REASSIGNMENT MODEL
+# The variables and the constraints are built once: the complete search and
+# the LNS approach both use this model
+#
+class VMReassignmentModel(object):
+    '''
+    The VM reassignment model, with the data needed by the search strategy
+    '''
+    # capacity: how the capacity constraints are posted ('sum' or 'pack')
+    def __init__(self, data, capacity = 'sum'):
+        # Cache some useful data
+        services = data['services']
+        nservices = len(services)
+        nservers = data['nservers']
+        cap_cpu = data['cap_cpu']
+
+        # split services into individual VMs
+        vm_svc = [] # service idx, for each VM
+        vm_cpu = [] # CPU requirement, for each VM
         
-        values_indexs = filter_min({i:e for i,e in enumerate(excess)})
-        sel_val_idx = values_indexs[0]
-        sel_val = values[sel_val_idx]
-        # se il server a cui assegnare la variabile è vuoto, faccio probing
-        if load[sel_val] == 0:
-            # sel_val == min(values)
-            #print 'probe'
-            return slv.AssignVariableValueOrFail(sel_var, sel_val)
+        for k, svc in enumerate(services):
+            vm_num = svc['vm_num']
+            vm_svc += [k] * vm_num
+            vm_cpu += [svc['vm_cpu']] * vm_num
+
+        nvm = len(vm_svc)
+
+        # da sistemare
+        svc_vm = [] # VM_num per ogni service
+        for i,svc in enumerate(services):
+            svc_vm.append(services[i]['vm_num'])    
+
+
+        # Build solver instance
+        slv = pywrapcp.Solver('production-scheduling')
+
+        # Cost variable (number of used services)
+        z = slv.IntVar(0, nservers, 'z')
+
+        # One variable for each VM
+        x = [slv.IntVar(0, nservers-1, 'x_%d' % i) for i in range(nvm)]
+
+        # VMs within the same service should go on different servers (this is
+        # enforced via an AllDifferent global constraint)
+        for k in range(nservices):
+            slv.Add(slv.AllDifferent([x[i] for i, svc in enumerate(vm_svc) if svc == k]))
+
+
+        # Symmetry breaking:
+        # - All VMs within a service are identical
+        # - The corresponding variables must be all differnt
+        # Hence, symmetries can be enforced via the lex-leader method by forcing
+        # the variale to follow a pre-specified order
+        for i in range(nvm-1):
+            if vm_svc[i] == vm_svc[i+1]:
+                slv.Add(x[i] < x[i+1])
+
+        # CPU capacity constraints: the load of each server is a variable, so
+        # that the search strategy can read it
+        load = [slv.IntVar(0, cap_cpu, 'load_%d' % j) for j in range(nservers)]
+        if capacity == 'sum':
+            for j in range(nservers):
+                # Obtain an expression for the total CPU requirement
+                cpu_cnt = sum(v * (x[i] == j) for i, v in enumerate(vm_cpu))
+                # Post CPU capacity constraint
+                slv.Add(load[j] == cpu_cnt)
         else:
-            return slv.AssignVariableValue(sel_var, sel_val)
+            # A single Pack constraint for the loads of all the servers, plus
+            # two lower bounds on the cost: the number of used servers and the
+            # L2 bin packing bound (or the size of the largest service)
+            pack = slv.Pack(x, nservers)
+            pack.AddWeightedSumEqualVarDimension(vm_cpu, load)
+            used = slv.IntVar(0, nservers, 'used')
+            pack.AddCountUsedBinDimension(used)
+            slv.Add(pack)
+            slv.Add(z >= used)
+            slv.Add(z >= max(l2_bound(vm_cpu, cap_cpu),
+                             max(svc['vm_num'] for svc in services)))
+
+        # Cost definition (exploits a dominance rule)
+        slv.Add(z == 1 + slv.Max(x))
+
+        # Store the model
+        self.slv, self.x, self.z, self.load = slv, x, z, load
+        self.vm_svc, self.vm_cpu, self.svc_vm = vm_svc, vm_cpu, svc_vm
+        self.nservers, self.cap_cpu = nservers, cap_cpu
+        # A lower bound on the cost
+        self.zlb = max(l2_bound(vm_cpu, cap_cpu), max(svc_vm))
+
+    # The search strategy. The first VM is put on server 0 only if the
+    # search starts with all the VMs unassigned
+    def decision_builder(self, fix_first = True):
+        return MaxRequestFirstDecisionBuilder(self.x, self.vm_cpu,
+                    self.vm_svc, self.svc_vm, self.cap_cpu, self.nservers,
+                    self.load, fix_first)
+
+    # Print the current solution
+    def print_solution(self):
+        x, vm_cpu = self.x, self.vm_cpu
+        print '--- z: %d' % self.z.Value()
+        print '--- x:', ', '.join('%3d' % var.Value() for var in x)
+
+        cpu_req = [sum(v for i, v in enumerate(vm_cpu) if x[i].Value() == j)
+                    for j in range(self.nservers)]
+        print '--- cpu:', ', '.join('%3d' % v for v in cpu_req)
+        print
+
 
 #
 # A FUNCTION TO BUILD AND SOLVE A MODEL
 # time_limit: if None, not time limit is employed. If integer, a time limit is
 #             enforced, but optimality is no longer guaranteed!
+# capacity:   how the capacity constraints are posted ('sum' or 'pack')
+# engine:     'cp' for a complete search, 'lns' for Large Neighborhood Search
+#             (see solve_problem_lns)
+# seed, lns_options: passed to solve_problem_lns (nbh_servers, nbh_services,
+#             nbh_time); the complete search is deterministic and has none
 #
-def solve_problem(data, time_limit = None):
-    # Cache some useful data
-    services = data['services']
-    nservices = len(services)
-    nservers = data['nservers']
-    cap_cpu = data['cap_cpu']
-
-    # split services into individual VMs
-    vm_svc = [] # service idx, for each VM
-    vm_cpu = [] # CPU requirement, for each VM
-    
-    for k, svc in enumerate(services):
-        vm_num = svc['vm_num']
-        vm_svc += [k] * vm_num
-        vm_cpu += [svc['vm_cpu']] * vm_num
-
-    nvm = len(vm_svc)
-
-    # da sistemare
-    svc_vm = [] # VM_num per ogni service
-    for i,svc in enumerate(services):
-        svc_vm.append(services[i]['vm_num'])    
-
-
-    # Build solver instance
-    slv = pywrapcp.Solver('production-scheduling')
-
-    # Cost variable (number of used services)
-    z = slv.IntVar(0, nservers, 'z')
-
-    # One variable for each VM
-    x = [slv.IntVar(0, nservers-1, 'x_%d' % i) for i in range(nvm)]
-
-    # VMs within the same service should go on different servers (this is
-    # enforced via an AllDifferent global constraint)
-    for k in range(nservices):
-        slv.Add(slv.AllDifferent([x[i] for i, svc in enumerate(vm_svc) if svc == k]))
-
-
-    # Symmetry breaking:
-    # - All VMs within a service are identical
-    # - The corresponding variables must be all differnt
-    # Hence, symmetries can be enforced via the lex-leader method by forcing
-    # the variale to follow a pre-specified order
-    for i in range(nvm-1):
-        if vm_svc[i] == vm_svc[i+1]:
-            slv.Add(x[i] < x[i+1])
-
-    # CPU capacity constraints
-    for j in range(nservers):
-        # Obtain an expression for the total CPU requirement
-        cpu_cnt = sum(v * (x[i] == j) for i, v in enumerate(vm_cpu))
-        # Post CPU capacity constraint
-        slv.Add(cpu_cnt <= cap_cpu)
-
-    # Cost definition (exploits a dominance rule)
-    slv.Add(z == 1 + slv.Max(x))
+def solve_problem(data, time_limit = None, capacity = 'sum', engine = 'cp',
+                  seed = None, **lns_options):
+    if engine == 'lns':
+        return solve_problem_lns(data, time_limit, capacity, seed = seed,
+                                 **lns_options)
+    if len(lns_options) > 0:
+        raise ValueError('LNS options with engine %s: %s' % \
+                (engine, ', '.join(sorted(lns_options))))
+
+    model = VMReassignmentModel(data, capacity)
+    slv, z = model.slv, model.z
 
     # DEFINE THE SEARCH STRATEGY
-    decision_builder = MaxRequestFirstDecisionBuilder(x, vm_cpu, vm_svc, svc_vm, cap_cpu, nservers)
+    decision_builder = model.decision_builder()
 
     # INIT THE SEARCH PROCESS
     search_monitors = [slv.Minimize(z, 1)]
@@ -207,13 +250,7 @@ def solve_problem(data, time_limit = None):
         #
         print '--- Solution found, time: %.3f (sec), branches: %d' % \
                     (slv.WallTime()/1000.0, slv.Branches())
-        print '--- z: %d' % z.Value()
-        print '--- x:', ', '.join('%3d' % var.Value() for var in x)
-
-        cpu_req = [sum(v for i, v in enumerate(vm_cpu) if x[i].Value() == j)
-                    for j in range(nservers)]
-        print '--- cpu:', ', '.join('%3d' % v for v in cpu_req)
-        print
+        model.print_solution()
 
         # STORE SOLUTION VALUE
         zbest = z.Value()
@@ -239,18 +276,183 @@ def solve_problem(data, time_limit = None):
     return zbest, branches, time
 
 
-# LOAD PROBLEM DATA
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
-
-with open(fname) as fin:
-    data = json.load(fin)
+# FIRST-FIT DECREASING: the VMs are considered by decreasing CPU requirement
+# and each one goes on the first server with enough capacity and no VM of the
+# same service. Returns the server of each VM, or None if some VM does not fit
+def first_fit_decreasing(vm_cpu, vm_svc, cap, nservers):
+    sol = [None] * len(vm_cpu)
+    load = [0] * nservers
+    svcs = [set() for j in range(nservers)]
+    for i in sorted(range(len(vm_cpu)), key=lambda i: (-vm_cpu[i], i)):
+        for j in range(nservers):
+            if load[j] + vm_cpu[i] <= cap and vm_svc[i] not in svcs[j]:
+                sol[i] = j
+                load[j] += vm_cpu[i]
+                svcs[j].add(vm_svc[i])
+                break
+        else:
+            return None
+    return sol
+
+
+# Relabel the servers of a solution by decreasing load, so that the least
+# loaded servers have the largest indices (and the empty ones come last).
+# The VMs of each service are then sorted by server, as required by the
+# symmetry breaking constraints. Neither step changes the server loads
+def normalize_solution(sol, vm_cpu, vm_svc, nservers):
+    load = [0] * nservers
+    for i, j in enumerate(sol):
+        load[j] += vm_cpu[i]
+    order = sorted(range(nservers), key=lambda j: (-load[j], j))
+    label = [None] * nservers
+    for pos, j in enumerate(order):
+        label[j] = pos
+    res = [label[j] for j in sol]
+    start = 0
+    for i in range(1, len(res)+1):
+        if i == len(res) or vm_svc[i] != vm_svc[start]:
+            res[start:i] = sorted(res[start:i])
+            start = i
+    return res
 
 
 #
-# CALL THE SOLUTION APPROACH
+# LARGE NEIGHBORHOOD SEARCH
+# Start from a first-fit decreasing solution, then repeatedly free a part of
+# the VMs, fix all the others to their value in the incumbent and search for
+# a solution with cost <= zbest (with a short time limit). Two neighborhoods
+# are used in turn:
+# - the VMs on the nbh_servers least loaded servers
+# - the VMs of nbh_services random services
+# The incumbent is normalized after each step (see normalize_solution).
+# time_limit: overall time limit (if None, 20 seconds)
+# nbh_time:   time limit for each neighborhood (ms)
+# seed:       seed for the random neighborhoods
 #
-solve_problem(data, time_limit=20000)
\ No newline at end of file
+def solve_problem_lns(data, time_limit = None, capacity = 'sum',
+                      nbh_servers = 3, nbh_services = 3, nbh_time = 500,
+                      seed = None):
+    if time_limit == None:
+        time_limit = 20000
+    rnd = random.Random(seed)
+    model = VMReassignmentModel(data, capacity)
+    slv, x, z = model.slv, model.x, model.z
+    vm_svc, vm_cpu, nservers = model.vm_svc, model.vm_cpu, model.nservers
+    nvm, nservices = len(x), len(model.svc_vm)
+
+    # The bounds for each neighborhood (undone at the end of each search)
+    bounds = slv.Assignment()
+    bounds.Add(x)
+    bounds.Add(z)
+
+    print '=================================================='
+    print 'Solving the problem via LNS'
+
+    # Initial solution: first-fit decreasing or, if it fails, the first
+    # solution of the complete search
+    sol = first_fit_decreasing(vm_cpu, vm_svc, model.cap_cpu, nservers)
+    if sol == None:
+        slv.NewSearch(model.decision_builder(),
+                      [slv.SolutionsLimit(1), slv.TimeLimit(time_limit)])
+        if slv.NextSolution():
+            sol = [var.Value() for var in x]
+        slv.EndSearch()
+    if sol == None:
+        print '--- No solution found'
+        print '=================================================='
+        return None, slv.Branches(), max(1, slv.WallTime())
+    sol = normalize_solution(sol, vm_cpu, vm_svc, nservers)
+    zbest = 1 + max(sol)
+    print '--- initial solution, time: %.3f (sec), z: %d' % \
+            (slv.WallTime()/1000.0, zbest)
+
+    it = 0
+    while zbest > model.zlb:
+        tlim = time_limit - slv.WallTime()
+        if tlim <= 0:
+            break
+
+        # Choose the VMs to be freed
+        if it % 2 == 0:
+            load = [0] * zbest
+            for i, j in enumerate(sol):
+                load[j] += vm_cpu[i]
+            servers = sorted(range(zbest), key=lambda j: (load[j], -j))
+            servers = set(servers[:nbh_servers])
+            free = [sol[i] in servers for i in range(nvm)]
+        else:
+            svcs = set(rnd.sample(range(nservices),
+                                  min(nbh_services, nservices)))
+            free = [vm_svc[i] in svcs for i in range(nvm)]
+        it += 1
+
+        # Re-optimize the free VMs
+        for i, var in enumerate(x):
+            if free[i]:
+                bounds.SetRange(var, 0, nservers-1)
+            else:
+                bounds.SetValue(var, sol[i])
+        bounds.SetRange(z, 0, zbest)
+        # NOTE: the Python decision builder must stay referenced during the
+        # search, since Compose does not keep it alive
+        nbh_db = model.decision_builder(fix_first = False)
+        db = slv.Compose([slv.RestoreAssignment(bounds), nbh_db])
+        slv.NewSearch(db, [slv.Minimize(z, 1),
+                           slv.TimeLimit(min(nbh_time, tlim))])
+        nsol = None
+        while slv.NextSolution():
+            nsol = [var.Value() for var in x]
+        slv.EndSearch()
+
+        # Move to the new solution (even if the cost is the same)
+        if nsol != None:
+            sol = normalize_solution(nsol, vm_cpu, vm_svc, nservers)
+            if 1 + max(sol) < zbest:
+                zbest = 1 + max(sol)
+                print '--- improved solution, time: %.3f (sec), z: %d' % \
+                        (slv.WallTime()/1000.0, zbest)
+
+    # obtain stats
+    branches, time = slv.Branches(), slv.WallTime()
+    # time capping
+    time = max(1, time)
+
+    # print stats
+    print '--- FINAL STATS'
+    print '--- z: %d' % zbest
+    print '--- x:', ', '.join('%3d' % v for v in sol)
+    if zbest == model.zlb:
+        print '--- Optimal (the cost matches the lower bound)'
+    print '--- Number of neighborhoods: %d' % it
+    print '--- Number of branches: %d' % branches
+    print '--- Computation time: %.3f (sec)' % (time / 1000.0)
+    print '=================================================='
+
+    # Return the solution value
+    return zbest, branches, time
+
+if __name__ == '__main__':
+    # LOAD PROBLEM DATA
+    parser = argparse.ArgumentParser(description='VM reassignment')
+    parser.add_argument('fname', help='data file')
+    parser.add_argument('--capacity', choices=['sum', 'pack'], default='sum',
+                        help='capacity constraints: sums or Pack')
+    parser.add_argument('--engine', choices=['cp', 'lns'], default='cp',
+                        help='complete search or Large Neighborhood Search')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed for the LNS neighborhoods')
+    args = parser.parse_args()
+    fname = args.fname
+
+    with open(fname) as fin:
+        data = json.load(fin)
+
+
+    #
+    # CALL THE SOLUTION APPROACH
+    #
+    if args.engine == 'lns':
+        solve_problem_lns(data, time_limit=20000, capacity=args.capacity,
+                          seed=args.seed)
+    else:
+        solve_problem(data, time_limit=20000, capacity=args.capacity)
\ No newline at end of file
@@ -5,70 +5,56 @@ from ortools.constraint_solver import pywrapcp
 import sys
 import json
 import math
-
-
-def filter_max(idx_value_pairs):
-    thr = None
-    res = []
-    for i, v in idx_value_pairs.items():
-        if thr is None or v == thr:
-            thr = v
-            res.append(i)
-        elif v > thr:
-            thr = v
-            res = [i]
-    return res
-
-
-def filter_min(idx_value_pairs):
-    thr = None
-    res = []
-    for i, v in idx_value_pairs.items():
-        if thr is None or v == thr:
-            thr = v
-            res.append(i)
-        elif v < thr:
-            thr = v
-            res = [i]
-    return res
-
-
-def get_domain(var):
-    return [j for j in range(var.Min(), var.Max()+1) if var.Contains(j)]
+import argparse
+import timeit
 
 
 class CustomDecisionBuilder(pywrapcp.PyDecisionBuilder):
   '''
   A dedicated DecisionBuilder for our problem
+
+  - the jobs are assigned by decreasing duration spread (i.e. difference
+    between the slowest and the fastest server type): a bad choice for
+    these jobs has the largest impact on the makespan
+  - the server types are tried by increasing cost * duration, which is
+    the contribution of the job to the cost for a fixed makespan
   '''
 
   def __init__(self, x, job_dur, srv_cost):
+    pywrapcp.PyDecisionBuilder.__init__(self)
     self.x = x
     self.job_dur = job_dur
     self.srv_cost = srv_cost
+    # Static order of the jobs (ties broken by index)
+    self.order = sorted(range(len(x)),
+                        key=lambda i: (min(job_dur[i]) - max(job_dur[i]), i))
+    # Static order of the server types, for each job
+    self.values = [sorted(range(len(srv_cost)),
+                          key=lambda k: (srv_cost[k] * durs[k], k))
+                   for durs in job_dur]
+    # Position in self.order of the first unbound job: all the jobs that
+    # come before it are bound
+    self.next_pos = pywrapcp.RevInteger(0)
 
   def Next(self, slv):
-    # Compute a number of useful pieces of infomation
-    # - list of unbound variables
-    unbound_idx = []
-    for i, var in enumerate(self.x):
-        if not var.Bound():
-            unbound_idx.append(i)
+    # Skip the jobs that have been bound since the last decision
+    pos = self.next_pos.Value()
+    while pos < len(self.order) and self.x[self.order[pos]].Bound():
+        pos += 1
+    self.next_pos.SetValue(slv, pos)
 
     # If all variables are bound, then stop search
-    if len(unbound_idx) == 0:
+    if pos == len(self.order):
         return None
 
-    # Select a variable to branch upon    
-    candidates = filter_min({i:self.x[i].Size() for i in unbound_idx})
-    sel_var_idx = candidates[0]
+    sel_var_idx = self.order[pos]
     sel_var = self.x[sel_var_idx]
 
-    # Identify the possible values
-    values = get_domain(sel_var)
-
-    # Pick the value to be assigned (server with the smallest index)
-    sel_val = min(values)
+    # Pick the cheapest server type still in the domain: if the decision
+    # is refuted, the next call will pick the following one
+    for sel_val in self.values[sel_var_idx]:
+        if sel_var.Contains(sel_val):
+            break
 
     # Return a Decision object
     return slv.AssignVariableValue(sel_var, sel_val)
@@ -77,8 +63,18 @@ class CustomDecisionBuilder(pywrapcp.PyDecisionBuilder):
 # A FUNCTION TO BUILD AND SOLVE A MODEL
 # time_limit: if None, not time limit is employed. If integer, a time limit is
 #             enforced, but optimality is no longer guaranteed!
+# engine:     'cp' for the model with z == mk * Sum(c_x), 'enum' to enumerate
+#             the makespan values (see solve_problem_enum), 'sweep' for the
+#             exact sweep algorithm (see solve_problem_sweep)
+# search:     search strategy for the 'cp' engine, either 'phase' (min size,
+#             max value) or 'custom' (see CustomDecisionBuilder)
 #
-def solve_problem(data, time_limit = None):
+def solve_problem(data, time_limit = None, engine = 'cp', search = 'phase'):
+    if engine == 'enum':
+        return solve_problem_enum(data, time_limit)
+    if engine == 'sweep':
+        return solve_problem_sweep(data, time_limit)
+
     # Cache some useful data
     srv_cost = data['srv_cost']
     job_dur = data['job_dur']
@@ -119,9 +115,11 @@ def solve_problem(data, time_limit = None):
 
 
     # DEFINE THE SEARCH STRATEGY
-    db1 = slv.Phase(x, slv.CHOOSE_MIN_SIZE_LOWEST_MIN,
-                                    slv.ASSIGN_MAX_VALUE)
-    #db1 = CustomDecisionBuilder(x,  job_dur, srv_cost)
+    if search == 'custom':
+        db1 = CustomDecisionBuilder(x,  job_dur, srv_cost)
+    else:
+        db1 = slv.Phase(x, slv.CHOOSE_MIN_SIZE_LOWEST_MIN,
+                                        slv.ASSIGN_MAX_VALUE)
     decision_builder = slv.Compose([db1])
 
     # INIT THE SEARCH PROCESS
@@ -169,18 +167,195 @@ def solve_problem(data, time_limit = None):
     return zbest, branches, time
 
 
-# LOAD PROBLEM DATA
-if len(sys.argv) != 2:
-    print 'Usage: python %s <data file>' % sys.argv[0]
-    sys.exit()
-else:
-    fname = sys.argv[1]
+#
+# SOLVE THE PROBLEM BY ENUMERATING THE MAKESPAN
+# The product mk * Sum(c_x) propagates very poorly. Once the makespan is
+# bounded, however, the problem becomes a min-cost assignment where the
+# server types that are too slow for a job are removed from its domain.
+# Hence, a single model (without the product) is built and the candidate
+# makespan values (i.e. the job durations) are tried in increasing order:
+# - for mk <= M, the cost Sum(c_x) is minimized
+# - the incumbent bounds the cost, i.e. Sum(c_x) <= (zbest-1) / M
+# - the enumeration stops when M times the cheapest possible cost cannot
+#   improve the incumbent
+#
+def solve_problem_enum(data, time_limit = None):
+    # Cache some useful data
+    srv_cost = data['srv_cost']
+    job_dur = data['job_dur']
+
+    nsrv = len(srv_cost) # number of server types
+    njobs = len(job_dur) # number of jobs
+    eoh = max(max(durs) for durs in job_dur) # largest overall duration
+
+    # Build solver instance
+    slv = pywrapcp.Solver('cloud-computing')
+
+    # One variable for each job (server type)
+    x = [slv.IntVar(0, nsrv-1, 'x_%d' % i) for i in range(njobs)]
+    # Cost and duration of each job
+    c_x = [slv.IntVar(min(srv_cost), max(srv_cost), 'c_x_%d' % i)
+            for i in range(njobs)]
+    m_x = [slv.IntVar(0, eoh, 'm_x_%d' % i) for i in range(njobs)]
+    for i in range(njobs):
+        slv.Add(c_x[i] == x[i].IndexOf(srv_cost))
+        slv.Add(m_x[i] == x[i].IndexOf(job_dur[i]))
+
+    # Makespan and total cost
+    mk = slv.IntVar(0, eoh, 'mk')
+    slv.Add(mk == slv.Max(m_x))
+    cost = slv.IntVar(0, njobs * max(srv_cost), 'cost')
+    slv.Add(cost == slv.Sum(c_x))
 
-with open(fname) as fin:
-    data = json.load(fin)
+    # Bounds for each subproblem (undone at the end of each search)
+    bounds = slv.Assignment()
+    bounds.Add(mk)
+    bounds.Add(cost)
+
+    # Search strategy: cheap costs first, then the server types
+    db = slv.Compose([slv.Phase(c_x, slv.CHOOSE_FIRST_UNBOUND,
+                                     slv.ASSIGN_MIN_VALUE),
+                      slv.Phase(x, slv.CHOOSE_FIRST_UNBOUND,
+                                   slv.ASSIGN_MIN_VALUE)])
+
+    # Candidate makespan values: each job must fit on its fastest server
+    mk_lb = max(min(durs) for durs in job_dur)
+    candidates = sorted(set(d for durs in job_dur for d in durs if d >= mk_lb))
+
+    zbest = None
+    timed_out = False
+    for M in candidates:
+        # No larger makespan can improve the incumbent
+        if zbest != None and M * njobs * min(srv_cost) >= zbest:
+            break
+        # Remaining time
+        if time_limit != None:
+            tlim = time_limit - slv.WallTime()
+            if tlim <= 0:
+                timed_out = True
+                break
+
+        bounds.SetRange(mk, 0, M)
+        if zbest != None:
+            bounds.SetRange(cost, 0, (zbest - 1) // M)
+        else:
+            bounds.SetRange(cost, 0, cost.Max())
+        search_monitors = [slv.Minimize(cost, 1)]
+        if time_limit != None:
+            search_monitors.append(slv.TimeLimit(tlim))
+        slv.NewSearch(slv.Compose([slv.RestoreAssignment(bounds), db]),
+                      search_monitors)
+        while slv.NextSolution():
+            z = mk.Value() * cost.Value()
+            if zbest == None or z < zbest:
+                print '--- Solution found, time: %.3f (sec), branches: %d' % \
+                            (slv.WallTime()/1000.0, slv.Branches())
+                print '--- z: %d' % z
+                print '--- mk: %d' % mk.Value()
+                print '--- x:', ', '.join('%3d' % var.Value() for var in x)
+                zbest = z
+        slv.EndSearch()
+
+    # obtain stats
+    branches, time = slv.Branches(), slv.WallTime()
+    # time capping
+    time = max(1, time)
+
+    # print stats
+    print '--- FINAL STATS'
+    if zbest == None:
+        print '--- No solution found'
+    print '--- Number of branches: %d' % branches
+    print '--- Computation time: %.3f (sec)' % (time / 1000.0)
+    if timed_out or (time_limit != None and time > time_limit):
+        print '--- Time limit exceeded'
+
+    # Return the solution value
+    return zbest, branches, time
 
 
 #
-# CALL THE SOLUTION APPROACH
+# SOLVE THE PROBLEM WITH A SWEEP OVER THE MAKESPAN
+# Once the makespan is fixed to M, each job can simply take the cheapest
+# server type with duration <= M. The (duration, job, server type) triples
+# are sorted by duration and swept in increasing order, keeping for each
+# job the cheapest server type seen so far and the sum of those costs: at
+# each distinct duration M where all jobs have a server type, M * cost is
+# a candidate solution value. The best candidate is the optimum.
+# No search is performed, hence the time limit is ignored and the number of
+# branches is always 0.
 #
-solve_problem(data, time_limit=20000)
\ No newline at end of file
+def solve_problem_sweep(data, time_limit = None):
+    start = timeit.default_timer()
+
+    # Cache some useful data
+    srv_cost = data['srv_cost']
+    job_dur = data['job_dur']
+    njobs = len(job_dur) # number of jobs
+
+    events = sorted((d, i, k) for i, durs in enumerate(job_dur)
+                              for k, d in enumerate(durs))
+
+    best_cost = [None] * njobs # cheapest cost so far, for each job
+    covered = 0 # number of jobs with at least one server type
+    cost = 0 # sum of best_cost over the covered jobs
+    zbest, mkbest = None, None
+    for pos, (d, i, k) in enumerate(events):
+        c = srv_cost[k]
+        if best_cost[i] == None:
+            best_cost[i] = c
+            covered += 1
+            cost += c
+        elif c < best_cost[i]:
+            cost -= best_cost[i] - c
+            best_cost[i] = c
+        # Evaluate the makespan after the last event with duration d
+        if pos+1 < len(events) and events[pos+1][0] == d:
+            continue
+        if covered == njobs and (zbest == None or d * cost < zbest):
+            zbest, mkbest = d * cost, d
+
+    # Rebuild the assignment for the best makespan
+    x = [min((srv_cost[k], k) for k, d in enumerate(durs) if d <= mkbest)[1]
+            for durs in job_dur]
+    print '--- Solution found, time: %.3f (sec), branches: %d' % \
+                (timeit.default_timer() - start, 0)
+    print '--- z: %d' % zbest
+    print '--- mk: %d' % max(durs[x[i]] for i, durs in enumerate(job_dur))
+    print '--- x:', ', '.join('%3d' % v for v in x)
+
+    # obtain stats (time in ms, as reported by the solver)
+    branches, time = 0, int(1000 * (timeit.default_timer() - start))
+    # time capping
+    time = max(1, time)
+
+    # print stats
+    print '--- FINAL STATS'
+    print '--- Number of branches: %d' % branches
+    print '--- Computation time: %.3f (sec)' % (time / 1000.0)
+
+    # Return the solution value
+    return zbest, branches, time
+
+
+if __name__ == '__main__':
+    # LOAD PROBLEM DATA
+    parser = argparse.ArgumentParser(description='Cloud computing')
+    parser.add_argument('fname', help='data file')
+    parser.add_argument('--engine', choices=['cp', 'enum', 'sweep'],
+                        default='cp', help='cp: z == mk * Sum(c_x), '
+                        'enum: enumerate mk, sweep: exact sweep over mk')
+    parser.add_argument('--search', choices=['phase', 'custom'],
+                        default='phase', help='search strategy (cp engine)')
+    args = parser.parse_args()
+    fname = args.fname
+
+    with open(fname) as fin:
+        data = json.load(fin)
+
+
+    #
+    # CALL THE SOLUTION APPROACH
+    #
+    solve_problem(data, time_limit=20000, engine=args.engine,
+                  search=args.search)
\ No newline at end of file
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+#
+# SOLVE ALL THE INSTANCES IN A DATA DIRECTORY, IN PARALLEL
+#
+# Every JSON file in the data directory is handed to the 'solve_problem'
+# function of the solver script, using a pool of worker processes (one per
+# core, by default). One record per instance is written to the output file:
+# a CSV file if its name ends with '.csv', a JSON-lines file otherwise.
+#
+# Example:
+#   python batch-solve.py Lab6/vm-reassignment.py Lab6/data-vm-very-hard \
+#                         very-hard.csv --time-limit 15000
+#
+# Extra keyword arguments for 'solve_problem' are passed with -o KEY=VALUE,
+# e.g. to compare two variants of the same model:
+#   python batch-solve.py Lab6/vm-reassignment.py Lab6/data-vm-very-hard \
+#                         pack.csv -o capacity=pack
+#
+# With --seeds N every instance is solved N times, passing seed=0..N-1 to
+# 'solve_problem', and the distribution of the solution times is reported:
+#   python batch-solve.py Lab5/es2-pls/pls.py Lab5/es2-pls/data-pls-very-hard \
+#                         luby.csv --seeds 10 -o restart=luby
+#
+import argparse
+import csv
+import glob
+import imp
+import json
+import math
+import multiprocessing
+import os
+import sys
+import timeit
+import traceback
+
+FIELDS = ['instance', 'seed', 'zbest', 'branches', 'time', 'wall_time',
+          'timed_out', 'error']
+
+# The solver module, loaded once in each worker process
+solver = None
+
+
+def load_solver(script):
+    # The solver scripts may import modules from their own directory
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    return imp.load_source('solver', script)
+
+
+# Parse a KEY=VALUE option: the value is read as JSON if possible (numbers,
+# booleans, ...) and kept as a string otherwise
+def parse_option(option):
+    if '=' not in option:
+        raise argparse.ArgumentTypeError('expected KEY=VALUE, got %s' % option)
+    key, value = option.split('=', 1)
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return key, value
+
+
+def init_worker(script, verbose):
+    global solver
+    solver = load_solver(script)
+    # The solvers print a lot: keep the console for the progress report
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def solve_instance(args):
+    fname, time_limit, options = args
+    record = {'instance': fname, 'seed': options.get('seed'),
+              'zbest': None, 'branches': None,
+              'time': None, 'wall_time': None, 'timed_out': None,
+              'error': None}
+    start = timeit.default_timer()
+    try:
+        with open(fname) as fin:
+            data = json.load(fin)
+        res = solver.solve_problem(data, time_limit, **options)
+        # Feasibility solvers (e.g. pls.py) return no solution value
+        if len(res) == 2:
+            res = (None,) + tuple(res)
+        record['zbest'], record['branches'], record['time'] = res
+        record['timed_out'] = time_limit != None and \
+                              record['time'] >= time_limit
+    except Exception:
+        record['error'] = traceback.format_exc().strip().split('\n')[-1]
+    record['wall_time'] = timeit.default_timer() - start
+    return record
+
+
+class RecordWriter(object):
+    '''
+    Write one record per instance, either as CSV or as JSON lines
+    '''
+    def __init__(self, fname):
+        self.fout = open(fname, 'w')
+        if fname.endswith('.csv'):
+            self.csv = csv.DictWriter(self.fout, FIELDS)
+            self.csv.writeheader()
+        else:
+            self.csv = None
+
+    def write(self, record):
+        if self.csv != None:
+            self.csv.writerow(record)
+        else:
+            self.fout.write(json.dumps(record, sort_keys=True) + '\n')
+        # Keep partial results if the batch is interrupted
+        self.fout.flush()
+
+    def close(self):
+        self.fout.close()
+
+
+# Value at the given percentile (nearest rank) of a sorted list
+def percentile(values, p):
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+# Print the distribution of the solution times (one line per instance, plus
+# one for the whole batch). Runs that failed or hit the time limit count with
+# their time, and are reported as timeouts
+def print_time_distribution(records):
+    print '=================================================='
+    print 'Solution time (sec): median, p90, p99, max, (#timeouts/#runs)'
+    by_instance = {}
+    for record in records:
+        by_instance.setdefault(record['instance'], []).append(record)
+    for name in sorted(by_instance.keys()) + [None]:
+        recs = by_instance[name] if name != None else records
+        times = sorted(r['time'] / 1000.0 if r['time'] != None
+                       else r['wall_time'] for r in recs)
+        timeouts = sum(1 for r in recs if r['timed_out'] or r['error'])
+        print '- %s: %.3f, %.3f, %.3f, %.3f (%d/%d)' % \
+                (name if name != None else 'ALL INSTANCES',
+                 percentile(times, 50), percentile(times, 90),
+                 percentile(times, 99), times[-1], timeouts, len(recs))
+
+
+def batch_solve(script, data_dir, out_fname, time_limit = None,
+                workers = None, verbose = False, options = None,
+                seeds = None):
+    fnames = sorted(glob.glob(os.path.join(data_dir, '*.json')))
+    if len(fnames) == 0:
+        print 'No instance found in %s' % data_dir
+        return
+    if workers == None:
+        workers = multiprocessing.cpu_count()
+    if options == None:
+        options = {}
+    if seeds != None:
+        tasks = [(fname, time_limit, dict(options, seed = seed))
+                 for fname in fnames for seed in range(seeds)]
+    else:
+        tasks = [(fname, time_limit, options) for fname in fnames]
+    workers = min(workers, len(tasks))
+
+    print '=================================================='
+    print 'Solving %d instances (%d runs) with %d workers' % \
+            (len(fnames), len(tasks), workers)
+    print '=================================================='
+    start = timeit.default_timer()
+    writer = RecordWriter(out_fname)
+    pool = multiprocessing.Pool(workers, init_worker, (script, verbose))
+    records = []
+    try:
+        for record in pool.imap_unordered(solve_instance, tasks, 1):
+            writer.write(record)
+            records.append(record)
+            if record['error'] != None:
+                status = 'ERROR: %s' % record['error']
+            elif record['zbest'] != None:
+                status = 'z: %d' % record['zbest']
+            else:
+                status = 'no solution value'
+            if record['timed_out']:
+                status += ' (time limit exceeded)'
+            if record['seed'] != None:
+                status = 'seed %d, %s' % (record['seed'], status)
+            print '--- %s: %s, wall time: %.3f (sec)' % \
+                    (record['instance'], status, record['wall_time'])
+        pool.close()
+    except BaseException:
+        # Ctrl-C or any other error: join() needs a closed (or terminated)
+        # pool, and the error must not be hidden by its ValueError
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        writer.close()
+    if seeds != None:
+        print_time_distribution(records)
+    print '=================================================='
+    print '- total wall time (sec): %.3f' % (timeit.default_timer() - start)
+    print '- records written to: %s' % out_fname
+    print '=================================================='
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+                description='Solve all the instances in a data directory')
+    parser.add_argument('script', help='solver script (with solve_problem)')
+    parser.add_argument('data_dir', help='directory with the JSON instances')
+    parser.add_argument('output', help='output file (.csv or .jsonl)')
+    parser.add_argument('--time-limit', type=int, default=20000,
+                        help='time limit per instance, in ms (0: none)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: #cores)')
+    parser.add_argument('--verbose', action='store_true',
+                        help='do not silence the solver output')
+    parser.add_argument('-o', '--option', type=parse_option, action='append',
+                        default=[], metavar='KEY=VALUE',
+                        help='extra keyword argument for solve_problem')
+    parser.add_argument('--seeds', type=int, default=None,
+                        help='solve each instance with seeds 0..SEEDS-1')
+    args = parser.parse_args()
+
+    batch_solve(args.script, args.data_dir, args.output,
+                time_limit = args.time_limit if args.time_limit > 0 else None,
+                workers = args.workers, verbose = args.verbose,
+                options = dict(args.option), seeds = args.seeds)
@@ -0,0 +1,15 @@
+#
+# HELPERS SHARED BY THE CUSTOM DECISION BUILDERS
+#
+
+
+# The values in the domain of a variable, in increasing order. They are
+# produced lazily by the native domain iterator of the solver, rather than
+# by probing every value between Min() and Max(); the domain must not
+# change while the values are consumed
+def get_domain(var):
+    it = var.DomainIterator()
+    it.Init()
+    while it.Ok():
+        yield it.Value()
+        it.Next()